@@ -0,0 +1,188 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from audio_monitor import SILENCE_DBFS
+from acoustic_metrics import power_to_db
+
+
+# Frequency ranges (Hz) of the tonal peaks each event is built from
+TONAL_SEARCH_BAND = (250.0, 2000.0)
+SIREN_BAND = (500.0, 1800.0)
+HORN_BAND = (250.0, 1000.0)
+
+
+class AcousticEvent(namedtuple('AcousticEvent', [
+        'kind', 'timestamp', 'confidence', 'frequency_hz', 'level_dbfs', 'duration'])):
+    """One detected siren or horn; timestamp is when it started"""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            'type': self.kind,
+            'timestamp': self.timestamp.isoformat(),
+            'confidence': round(self.confidence, 2),
+            'frequency_hz': round(self.frequency_hz, 1),
+            'level_dbfs': round(self.level_dbfs, 1),
+            'duration': round(self.duration, 2)
+        }
+
+
+class AcousticEventDetector:
+    def __init__(self, metrics, on_event=None, siren_window=3.0, tonal_threshold=10.0,
+                 min_level=-60.0, siren_min_fraction=0.6, siren_min_sweep=150.0, horn_jump=10.0,
+                 horn_min_duration=0.2, horn_max_duration=3.0, horn_max_sweep=60.0, cooldown=5.0):
+        """
+        Siren / horn detector reusing the power spectrum AcousticMetrics computed for the block
+        (no FFT of its own); call update() right after metrics.update()
+        Per block it only finds the strongest tonal peak in TONAL_SEARCH_BAND and the band
+        level, and keeps the peak frequency in a fixed ring; the decisions are:
+          siren: a tonal peak inside SIREN_BAND in most blocks of the last siren_window
+                 seconds, sweeping over at least siren_min_sweep Hz
+          horn:  a burst horn_jump dB above the background with a steady tonal peak inside
+                 HORN_BAND, lasting horn_min_duration..horn_max_duration seconds
+        metrics: the stream's AcousticMetrics
+        on_event: callback(AcousticEvent), run on the caller's thread
+        tonal_threshold: dB the peak has to stand above the mean of the search band
+        min_level: dBFS below which blocks are treated as too quiet to classify
+        cooldown: seconds after a siren ends before another one is reported
+        """
+        self.metrics = metrics
+        self.block_duration = block_duration = metrics.block_size / metrics.sample_rate
+        self.on_event = on_event
+        self.tonal_threshold = tonal_threshold
+        self.min_level = min_level
+        self.siren_min_fraction = siren_min_fraction
+        self.siren_min_sweep = siren_min_sweep
+        self.horn_jump = horn_jump
+        self.horn_min_blocks = max(1, round(horn_min_duration / block_duration))
+        self.horn_max_blocks = max(self.horn_min_blocks, round(horn_max_duration / block_duration))
+        self.horn_max_sweep = horn_max_sweep
+        self.cooldown_blocks = round(cooldown / block_duration)
+
+        self.search = slice(*np.searchsorted(metrics.frequencies, TONAL_SEARCH_BAND))
+        self.search_frequencies = metrics.frequencies[self.search]
+        self.search_scale = metrics.bin_scale[self.search]
+
+        # Peak frequency of the last siren_window seconds of blocks (NaN when not tonal)
+        self.num_blocks = max(1, round(siren_window / block_duration))
+        self.peak_frequencies = np.full(self.num_blocks, np.nan)
+        self.index = 0
+
+        self.siren_active = False
+        self.siren_quiet_blocks = 0
+        self.cooldown_left = 0
+
+        self.background = None
+        self.horn_blocks = 0
+        self.horn_too_long = False
+        self.horn_start = None
+        self.horn_frequencies = np.empty(self.horn_max_blocks)
+        self.horn_level = SILENCE_DBFS
+
+        # Stats
+        self.blocks = 0
+        self.events = {'siren': 0, 'horn': 0}
+
+    def update(self, now=None):
+        """Analyze the block metrics.update() just processed"""
+        now = now or datetime.now()
+        self.blocks += 1
+
+        band = self.metrics.spectrum[self.search]
+        peak_bin = int(np.argmax(band))
+        total_power = band.sum()
+        level = float(power_to_db(np.dot(band, self.search_scale)))
+        tonality = 10 * np.log10(max(band[peak_bin], 1e-20) * len(band) / max(total_power, 1e-20))
+
+        tonal = tonality >= self.tonal_threshold and level >= self.min_level
+        peak_frequency = float(self.search_frequencies[peak_bin]) if tonal else np.nan
+
+        self.peak_frequencies[self.index] = peak_frequency
+        self.index = (self.index + 1) % self.num_blocks
+
+        self.update_siren(now, level)
+        if not self.siren_active:
+            self.update_horn(now, level, peak_frequency)
+
+        # Background follows the band level slowly, and not during a burst that may still be a horn
+        if self.background is None:
+            self.background = level
+        elif not self.horn_blocks:
+            self.background += 0.02 * (level - self.background)
+
+    def update_siren(self, now, level):
+        in_band = self.peak_frequencies[(self.peak_frequencies >= SIREN_BAND[0]) &
+                                        (self.peak_frequencies <= SIREN_BAND[1])]
+        fraction = len(in_band) / self.num_blocks
+        sweep = float(in_band.max() - in_band.min()) if len(in_band) else 0.0
+        detected = fraction >= self.siren_min_fraction and sweep >= self.siren_min_sweep
+
+        if self.cooldown_left:
+            self.cooldown_left -= 1
+
+        if detected and not self.siren_active and not self.cooldown_left:
+            self.siren_active = True
+            self.siren_quiet_blocks = 0
+            window = self.num_blocks * self.block_duration
+            confidence = min(1.0, fraction) * min(1.0, sweep / (3 * self.siren_min_sweep))
+            self.emit(AcousticEvent('siren', now - timedelta(seconds=window), confidence,
+                                    float(np.median(in_band)), level, window))
+        elif self.siren_active:
+            # Stay active through short dropouts; the cooldown starts once it is really gone
+            self.siren_quiet_blocks = 0 if detected else self.siren_quiet_blocks + 1
+            if self.siren_quiet_blocks >= self.num_blocks:
+                self.siren_active = False
+                self.cooldown_left = self.cooldown_blocks
+
+    def update_horn(self, now, level, peak_frequency):
+        is_burst = (
+            self.background is not None
+            and level >= self.background + self.horn_jump
+            and HORN_BAND[0] <= peak_frequency <= HORN_BAND[1]
+        )
+
+        if is_burst:
+            if self.horn_too_long:
+                return
+            if self.horn_blocks == self.horn_max_blocks:
+                # Too long for a horn (a tonal machine, music...): drop it and let the background adapt
+                self.horn_blocks = 0
+                self.horn_too_long = True
+                return
+            if not self.horn_blocks:
+                self.horn_start = now
+                self.horn_level = level
+            self.horn_frequencies[self.horn_blocks] = peak_frequency
+            self.horn_blocks += 1
+            self.horn_level = max(self.horn_level, level)
+            return
+
+        self.horn_too_long = False
+        if self.horn_blocks >= self.horn_min_blocks:
+            frequencies = self.horn_frequencies[:self.horn_blocks]
+            if frequencies.max() - frequencies.min() <= self.horn_max_sweep:
+                jump = self.horn_level - self.background
+                confidence = min(1.0, jump / (2 * self.horn_jump))
+                self.emit(AcousticEvent('horn', self.horn_start, confidence, float(np.median(frequencies)),
+                                        self.horn_level, self.horn_blocks * self.block_duration))
+        self.horn_blocks = 0
+
+    def emit(self, event):
+        self.events[event.kind] += 1
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                print(f"⚠️ Acoustic event callback error: {e}")
+
+    def get_stats(self):
+        """Return detector statistics"""
+        return {
+            'blocks': self.blocks,
+            'sirens': self.events['siren'],
+            'horns': self.events['horn'],
+            'siren_active': self.siren_active
+        }
+
@@ -0,0 +1,154 @@
+import numpy as np
+
+from audio_monitor import FULL_SCALE, SILENCE_DBFS
+
+
+# Octave band centre frequencies (Hz); bands above Nyquist are skipped
+OCTAVE_BANDS = (63, 125, 250, 500, 1000, 2000, 4000, 8000)
+
+# Resolution of the level histogram behind L10/L50/L90
+HISTOGRAM_STEP = 0.5
+
+
+def a_weighting(frequencies):
+    """IEC 61672 A-weighting as a power gain per frequency"""
+    f2 = np.asarray(frequencies, dtype=np.float64) ** 2
+    ra = (12194.0 ** 2 * f2 ** 2) / (
+        (f2 + 20.6 ** 2) * np.sqrt((f2 + 107.7 ** 2) * (f2 + 737.9 ** 2)) * (f2 + 12194.0 ** 2)
+    )
+    # +2.0 dB normalizes the gain to 0 dB at 1 kHz
+    return (ra * 10 ** (2.0 / 20)) ** 2
+
+
+def octave_bands(sample_rate):
+    """Centre frequencies of the octave bands that fit below Nyquist"""
+    return [centre for centre in OCTAVE_BANDS if centre * np.sqrt(2) <= sample_rate / 2]
+
+
+def band_name(centre):
+    """'63Hz', '1000Hz', ... (not bare numbers, which Firebase may turn into array indices)"""
+    return f"{centre}Hz"
+
+
+def power_to_db(power):
+    """Mean square (16-bit sample units) -> dBFS, floored at SILENCE_DBFS; works on arrays"""
+    power = np.maximum(np.asarray(power, dtype=np.float64), 1e-20)
+    return np.maximum(10 * np.log10(power / (FULL_SCALE * FULL_SCALE)), SILENCE_DBFS)
+
+
+class AcousticMetrics:
+    def __init__(self, sample_rate=16000, block_size=1600, window=60.0):
+        """
+        Incremental spectral noise metrics for one stream
+        Each update() takes one hop of samples and runs one FFT over a 50%-overlapping
+        Hann frame (previous hop + this hop). Everything below is kept over the last `window`
+        seconds in fixed-size rings with running sums, so an update costs the same no matter
+        how long the stream has been running:
+          laeq:   A-weighted equivalent level
+          l10/l50/l90: A-weighted levels exceeded 10/50/90% of the time (level histogram)
+          bands:  octave band equivalent levels
+        All levels are dBFS (A-weighted where noted); there is no SPL calibration
+        sample_rate: Hz of the incoming samples
+        block_size: samples per update() (the STFT hop)
+        window: seconds the metrics cover
+        """
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+
+        self.frame_size = 2 * block_size
+        self.fft_size = 1 << (self.frame_size - 1).bit_length()
+        self.frame = np.zeros(self.frame_size, dtype=np.float32)
+        self.hann = np.hanning(self.frame_size).astype(np.float32)
+        self.windowed = np.zeros(self.fft_size, dtype=np.float32)
+
+        # Per-bin factors turning |X|^2 into mean-square contributions (one-sided Parseval)
+        self.frequencies = np.fft.rfftfreq(self.fft_size, 1.0 / sample_rate)
+        bin_scale = np.full(len(self.frequencies), 2.0)
+        bin_scale[0] = 1.0
+        if self.fft_size % 2 == 0:
+            bin_scale[-1] = 1.0
+        bin_scale /= self.fft_size * np.sum(self.hann.astype(np.float64) ** 2)
+        self.bin_scale = bin_scale
+        self.a_scale = bin_scale * a_weighting(self.frequencies)
+
+        # Octave bands as a (bins x bands) matrix, so all band powers are one product
+        centres = octave_bands(sample_rate)
+        self.band_names = [band_name(centre) for centre in centres]
+        self.band_matrix = np.zeros((len(self.frequencies), len(centres)))
+        for band, centre in enumerate(centres):
+            in_band = (self.frequencies >= centre / np.sqrt(2)) & (self.frequencies < centre * np.sqrt(2))
+            self.band_matrix[in_band, band] = bin_scale[in_band]
+
+        # Rings over the window, one slot per block, plus running sums
+        self.num_blocks = max(1, round(window * sample_rate / block_size))
+        self.a_energy = np.zeros(self.num_blocks)
+        self.band_energy = np.zeros((self.num_blocks, len(self.band_names)))
+        self.a_total = 0.0
+        self.band_total = np.zeros(len(self.band_names))
+
+        self.num_bins = int(-SILENCE_DBFS / HISTOGRAM_STEP) + 1
+        self.histogram = np.zeros(self.num_bins, dtype=np.int64)
+        self.level_bins = np.zeros(self.num_blocks, dtype=np.intp)
+
+        self.index = 0
+        self.filled = 0
+
+        # Latest power spectrum, for detectors that want to reuse the FFT
+        self.spectrum = np.zeros(len(self.frequencies))
+
+    def update(self, samples):
+        """Add one hop (block_size samples, 16-bit sample units) to the metrics"""
+        self.frame[:self.block_size] = self.frame[self.block_size:]
+        self.frame[self.block_size:] = samples
+
+        np.multiply(self.frame, self.hann, out=self.windowed[:self.frame_size])
+        spectrum = np.fft.rfft(self.windowed)
+        np.square(spectrum.real, out=self.spectrum)
+        self.spectrum += spectrum.imag ** 2
+
+        a_power = float(np.dot(self.spectrum, self.a_scale))
+        band_power = self.spectrum @ self.band_matrix
+
+        # Replace the oldest block in every ring
+        i = self.index
+        self.a_total += a_power - self.a_energy[i]
+        self.band_total += band_power - self.band_energy[i]
+        self.a_energy[i] = a_power
+        self.band_energy[i] = band_power
+
+        level_bin = min(self.num_bins - 1, int((float(power_to_db(a_power)) - SILENCE_DBFS) / HISTOGRAM_STEP))
+        if self.filled == self.num_blocks:
+            self.histogram[self.level_bins[i]] -= 1
+        self.histogram[level_bin] += 1
+        self.level_bins[i] = level_bin
+
+        self.index = (i + 1) % self.num_blocks
+        self.filled = min(self.filled + 1, self.num_blocks)
+
+        # Running sums pick up rounding error; re-sum once per window (amortized O(1))
+        if self.index == 0:
+            self.a_total = float(self.a_energy.sum())
+            self.band_total = self.band_energy.sum(axis=0)
+
+    def percentile_level(self, exceeded):
+        """Level exceeded `exceeded` percent of the time over the window"""
+        target = self.filled * exceeded / 100.0
+        from_top = np.cumsum(self.histogram[::-1])
+        position = int(np.searchsorted(from_top, target, side='left'))
+        level_bin = max(0, self.num_bins - 1 - position)
+        return SILENCE_DBFS + level_bin * HISTOGRAM_STEP
+
+    def get_metrics(self):
+        """Current metrics over the window; None before the first block"""
+        if not self.filled:
+            return None
+
+        band_levels = power_to_db(np.maximum(self.band_total, 0) / self.filled)
+        return {
+            'laeq': round(float(power_to_db(max(self.a_total, 0) / self.filled)), 2),
+            'l10': self.percentile_level(10),
+            'l50': self.percentile_level(50),
+            'l90': self.percentile_level(90),
+            'bands': {name: round(float(level), 2) for name, level in zip(self.band_names, band_levels)},
+            'window': self.filled * self.block_size / self.sample_rate
+        }
@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+# Bucket key format per granularity; keys sort in time order
+BUCKET_FORMATS = {
+    'minute': '%Y%m%d_%H%M',
+    'hour': '%Y%m%d_%H',
+    'day': '%Y%m%d'
+}
+
+BUCKET_LENGTHS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+
+def bucket_end(granularity, key):
+    """Moment a bucket's period ends"""
+    return datetime.strptime(key, BUCKET_FORMATS[granularity]) + BUCKET_LENGTHS[granularity]
+
+
+class RunningStats:
+    def __init__(self, max_value=100):
+        """
+        Count, mean, max and p95 of a non-negative integer metric with O(1) updates
+        Values are tallied in a histogram with one bin per value, so percentiles are exact and
+        need no stored samples; it starts with max_value + 1 bins and doubles when a larger
+        value arrives
+        """
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.histogram = np.zeros(max_value + 1, dtype=np.int64)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value >= len(self.histogram):
+            size = max(value + 1, 2 * len(self.histogram))
+            self.histogram = np.concatenate([self.histogram, np.zeros(size - len(self.histogram), dtype=np.int64)])
+        self.histogram[value] += 1
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        cumulative = np.cumsum(self.histogram)
+        return int(np.searchsorted(cumulative, q / 100.0 * self.count))
+
+    def to_dict(self):
+        return {
+            'mean': round(self.total / self.count, 2) if self.count else 0,
+            'max': self.max,
+            'p95': self.percentile(95)
+        }
+
+
+class Bucket:
+    def __init__(self, key, opened_at, partial=False):
+        """
+        Rolling stats of one location over one time bucket
+        opened_at: moment of the first sample
+        partial: the bucket doesn't cover its whole period (opened after the period began,
+                 or closed before it ended)
+        """
+        self.key = key
+        self.opened_at = opened_at
+        self.partial = partial
+        self.samples = 0
+        self.vehicles = RunningStats()
+        self.people = RunningStats()
+        self.class_sums = defaultdict(int)
+        self.traffic_levels = Counter()
+
+    def add(self, vehicle_count, person_count, vehicle_types, traffic_level):
+        self.samples += 1
+        self.vehicles.add(vehicle_count)
+        self.people.add(person_count)
+        for class_name, count in vehicle_types.items():
+            self.class_sums[class_name] += count
+        self.traffic_levels[traffic_level] += 1
+
+    def emit_key(self):
+        """
+        Key the bucket is written under; partial buckets get their own key, so the rest of the
+        period (e.g. after a restart) never overwrites them
+        """
+        if self.partial:
+            return f"{self.key}_partial_{self.opened_at.strftime('%H%M%S')}"
+        return self.key
+
+    def to_dict(self):
+        return {
+            'samples': self.samples,
+            'partial': self.partial,
+            'cars': self.vehicles.to_dict(),
+            'people': self.people.to_dict(),
+            'vehicle_breakdown': {
+                'cars': self.class_sums.get('car', 0),
+                'motorcycles': self.class_sums.get('motorcycle', 0),
+                'buses': self.class_sums.get('bus', 0),
+                'trucks': self.class_sums.get('truck', 0),
+                'bicycles': self.class_sums.get('bicycle', 0)
+            },
+            'traffic_level': self.traffic_levels.most_common(1)[0][0] if self.traffic_levels else None
+        }
+
+
+class BucketAggregator:
+    def __init__(self, on_close, granularities=('minute', 'hour', 'day'), close_delay=5.0):
+        """
+        Incremental per-location rollups over minute/hour/day buckets
+        Buckets close when their period is over by the wall clock (start() runs the timer),
+        whether or not the location produced another sample. Buckets that cover only part of
+        their period (the process started or stopped inside it) are marked partial and
+        written under their own key.
+        on_close: callable(location_key, granularity, bucket_key, summary) called once
+                  for every bucket that closes (outside the aggregator lock)
+        granularities: which of BUCKET_FORMATS to keep
+        close_delay: seconds after a period ends before its buckets close, for samples still
+                     on their way through the sink queues
+        """
+        self.on_close = on_close
+        self.granularities = granularities
+        self.close_delay = timedelta(seconds=close_delay)
+        self.started_at = datetime.now()
+        self.buckets = {}
+        # Newest closed bucket key per (location, granularity); later samples for it are too late
+        self.closed_keys = {}
+        self.lock = threading.Lock()
+
+        self.thread = None
+        self.stopped = threading.Event()
+
+        # Stats
+        self.late_samples = 0
+
+    def start(self, interval=1.0):
+        """Close buckets on a wall-clock timer"""
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, args=(interval,), name='rollups', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the timer (open buckets stay open until flush())"""
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join(timeout=5)
+        self.thread = None
+
+    def _run(self, interval):
+        while not self.stopped.wait(interval):
+            self.close_due()
+
+    def add(self, location_key, vehicle_count, person_count, vehicle_types, traffic_level, timestamp=None):
+        """Fold one sample into the open buckets, closing any the sample has moved past"""
+        moment = datetime.fromtimestamp(timestamp if timestamp is not None else time.time())
+        closed = []
+
+        with self.lock:
+            for granularity in self.granularities:
+                key = moment.strftime(BUCKET_FORMATS[granularity])
+                if key <= self.closed_keys.get((location_key, granularity), ''):
+                    # Its bucket was already written; re-opening it would overwrite that
+                    self.late_samples += 1
+                    continue
+
+                bucket = self.buckets.get((location_key, granularity))
+                if bucket is None or bucket.key != key:
+                    if bucket is not None:
+                        closed.append(self._close(location_key, granularity, bucket))
+                    period_start = datetime.strptime(key, BUCKET_FORMATS[granularity])
+                    bucket = Bucket(key, moment, partial=period_start < self.started_at)
+                    self.buckets[(location_key, granularity)] = bucket
+
+                bucket.add(vehicle_count, person_count, vehicle_types, traffic_level)
+
+        self._emit(closed)
+
+    def close_due(self, now=None):
+        """Close every bucket whose period ended (plus close_delay) by the wall clock"""
+        now = now or datetime.now()
+        with self.lock:
+            due = [(location_key, granularity) for (location_key, granularity), bucket in self.buckets.items()
+                   if bucket_end(granularity, bucket.key) + self.close_delay <= now]
+            closed = [self._close(location_key, granularity, self.buckets.pop((location_key, granularity)))
+                      for location_key, granularity in due]
+
+        self._emit(closed)
+
+    def flush(self):
+        """Close every open bucket (on shutdown); those whose period isn't over are marked partial"""
+        now = datetime.now()
+        with self.lock:
+            closed = []
+            for (location_key, granularity), bucket in self.buckets.items():
+                if bucket_end(granularity, bucket.key) > now:
+                    bucket.partial = True
+                closed.append(self._close(location_key, granularity, bucket))
+            self.buckets = {}
+
+        self._emit(closed)
+
+    def _close(self, location_key, granularity, bucket):
+        """Remember a bucket as closed (lock held)"""
+        self.closed_keys[(location_key, granularity)] = bucket.key
+        return location_key, granularity, bucket
+
+    def _emit(self, closed):
+        for location_key, granularity, bucket in closed:
+            try:
+                self.on_close(location_key, granularity, bucket.emit_key(), bucket.to_dict())
+            except Exception as e:
+                print(f"⚠️ [{location_key}] Rollup write error: {e}")
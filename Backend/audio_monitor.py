@@ -0,0 +1,233 @@
+import math
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+
+# Full scale of 16-bit PCM, same reference pydub uses for dBFS
+FULL_SCALE = 32768.0
+
+# Reported instead of -inf for digital silence
+SILENCE_DBFS = -100.0
+
+
+def to_dbfs(mean_square):
+    """Mean square of 16-bit samples -> dBFS"""
+    if mean_square <= 0:
+        return SILENCE_DBFS
+    return max(SILENCE_DBFS, 10 * math.log10(mean_square / (FULL_SCALE * FULL_SCALE)))
+
+
+class AudioLevelMonitor:
+    def __init__(self, stream_url, name='audio', sample_rate=16000, block_duration=0.1, window=5.0,
+                 publish_interval=5.0, on_level=None, refresh_url=None, retry_interval=5.0, ffmpeg_path=None,
+                 analyzer=None, event_detector=None):
+        """
+        Continuous loudness of one audio stream from a single long-lived ffmpeg process
+        ffmpeg decodes the stream to mono 16-bit PCM on a pipe; every block is read into a
+        preallocated buffer and its energy goes into a ring covering the last `window`
+        seconds, so the sliding RMS / dBFS is always current
+        block_duration: seconds of audio per block (the update granularity)
+        window: seconds covered by the sliding RMS
+        publish_interval: seconds between on_level(level) calls (0 to only poll get_level())
+        on_level: callback(level) run on the monitor thread with the latest level dict
+        refresh_url: callable returning a fresh stream URL, used when the stream ends or fails
+        analyzer: optional per-block analyzer (e.g. AcousticMetrics) fed every block; its
+                  get_metrics() is added to published levels under 'metrics'
+        event_detector: optional detector (e.g. AcousticEventDetector) updated right after the
+                        analyzer on every block, reusing its spectrum
+        """
+        self.stream_url = stream_url
+        self.name = name
+        self.sample_rate = sample_rate
+        self.publish_interval = publish_interval
+        self.on_level = on_level
+        self.refresh_url = refresh_url
+        self.retry_interval = retry_interval
+        self.ffmpeg_path = ffmpeg_path or shutil.which('ffmpeg')
+
+        self.block_size = max(1, int(sample_rate * block_duration))
+        self.block = np.empty(self.block_size, dtype='<i2')
+        self.block_buffer = memoryview(self.block).cast('B')
+        self.samples = np.empty(self.block_size, dtype=np.float32)
+
+        self.analyzer = analyzer
+        if analyzer is not None and analyzer.block_size != self.block_size:
+            raise ValueError(f"Analyzer expects {analyzer.block_size}-sample blocks, monitor reads {self.block_size}")
+        self.event_detector = event_detector
+        if event_detector is not None and analyzer is None:
+            raise ValueError("An event detector needs an analyzer to take its spectrum from")
+
+        # Sum of squares per block over the sliding window
+        self.energies = np.zeros(max(1, round(window / block_duration)), dtype=np.float64)
+        self.filled = 0
+        self.index = 0
+
+        self.level = None
+        self.last_publish = 0.0
+        self.process = None
+        self.thread = None
+        self.running = False
+        self.stopped = threading.Event()
+
+        # Stats
+        self.blocks = 0
+        self.restarts = 0
+        self.publishes = 0
+
+    def start(self):
+        """Start ffmpeg and the reader thread"""
+        if self.running:
+            return
+        if not self.ffmpeg_path:
+            print(f"❌ [{self.name}] ffmpeg not found, audio monitoring disabled")
+            return
+        self.running = True
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name=f"audio-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the reader thread and the ffmpeg process"""
+        if not self.running:
+            return
+        self.running = False
+        self.stopped.set()
+        self.close()
+        self.thread.join(timeout=5)
+
+    def build_command(self):
+        """Build the ffmpeg command line: any input -> mono s16le PCM at sample_rate on stdout"""
+        cmd = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin']
+
+        if self.stream_url.startswith('http'):
+            cmd += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+
+        cmd += [
+            '-i', self.stream_url,
+            '-vn', '-sn',
+            '-ac', '1', '-ar', str(self.sample_rate),
+            '-f', 's16le', 'pipe:1'
+        ]
+        return cmd
+
+    def open(self):
+        """Start the ffmpeg process"""
+        try:
+            self.process = subprocess.Popen(
+                self.build_command(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0
+            )
+            return True
+        except OSError as e:
+            print(f"❌ [{self.name}] Failed to start ffmpeg: {e}")
+            self.process = None
+            return False
+
+    def close(self):
+        """Stop the ffmpeg process"""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.stdout.close()
+        except Exception:
+            pass
+        process.kill()
+        process.wait()
+
+    def read_block(self):
+        """Fill the block buffer from the pipe; False when the stream ended"""
+        process = self.process
+        if process is None:
+            return False
+
+        offset = 0
+        size = len(self.block_buffer)
+        while offset < size:
+            try:
+                n = process.stdout.readinto(self.block_buffer[offset:])
+            except (OSError, ValueError):
+                return False
+            if not n:
+                return False
+            offset += n
+        return True
+
+    def process_block(self):
+        """Add one block's energy to the sliding window and publish when due"""
+        np.multiply(self.block, 1.0, out=self.samples, casting='unsafe')
+        self.energies[self.index] = np.dot(self.samples, self.samples)
+        self.index = (self.index + 1) % len(self.energies)
+        self.filled = min(self.filled + 1, len(self.energies))
+        self.blocks += 1
+
+        if self.analyzer is not None:
+            self.analyzer.update(self.samples)
+            if self.event_detector is not None:
+                self.event_detector.update()
+
+        mean_square = self.energies.sum() / (self.filled * self.block_size)
+        self.level = {
+            'dbfs': round(to_dbfs(mean_square), 2),
+            'rms': round(math.sqrt(mean_square), 1),
+            'window': self.filled * self.block_size / self.sample_rate,
+            'timestamp': time.time()
+        }
+
+        if self.on_level and self.publish_interval and time.time() - self.last_publish >= self.publish_interval:
+            self.last_publish = time.time()
+            self.publishes += 1
+            level = self.level
+            if self.analyzer is not None:
+                level = dict(level, metrics=self.analyzer.get_metrics())
+            try:
+                self.on_level(level)
+            except Exception as e:
+                print(f"⚠️ [{self.name}] Audio level callback error: {e}")
+
+    def reset_window(self):
+        self.energies.fill(0)
+        self.filled = 0
+        self.index = 0
+
+    def _run(self):
+        """Reader loop: decode continuously, restart ffmpeg when the stream drops"""
+        while self.running:
+            if self.open():
+                while self.running and self.read_block():
+                    self.process_block()
+                self.close()
+
+            if not self.running:
+                break
+
+            print(f"⚠️ [{self.name}] Audio stream ended, reconnecting in {self.retry_interval:.0f}s...")
+            if self.stopped.wait(self.retry_interval):
+                break
+            self.reset_window()
+            self.restarts += 1
+
+            if self.refresh_url:
+                try:
+                    self.stream_url = self.refresh_url() or self.stream_url
+                except Exception as e:
+                    print(f"⚠️ [{self.name}] Audio URL refresh failed: {e}")
+
+    def get_level(self):
+        """Latest level dict ({'dbfs', 'rms', 'window', 'timestamp'}), or None before the first block"""
+        return self.level
+
+    def get_stats(self):
+        """Return monitor statistics"""
+        return {
+            'blocks': self.blocks,
+            'seconds': self.blocks * self.block_size / self.sample_rate,
+            'restarts': self.restarts,
+            'publishes': self.publishes
+        }
@@ -0,0 +1,197 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from queue import Queue, Empty, Full
+
+
+class CSVSink:
+    def __init__(self, filename, header, flush_interval=2.0, flush_rows=500, max_bytes=50 * 1024 * 1024,
+                 rotate_daily=True, compress=False, max_queue=10000):
+        """
+        Append-only CSV file owned by a single writer thread
+        Callers only queue rows; the writer keeps one buffered handle open and flushes
+        every flush_rows rows or flush_interval seconds, and on shutdown
+        A caller that already runs on its own thread can skip start() and use
+        open() / write_rows() / flush() / close() directly
+        filename: active file; rotated files are renamed to <name>.<YYYYmmdd_HHMMSS>.csv (.gz)
+        header: column names, checked against an existing file before appending to it
+        max_bytes: rotate once the active file grows past this size (None to disable)
+        rotate_daily: rotate when the day changes
+        compress: gzip rotated files
+        max_queue: bounded queue size; rows arriving when it is full are dropped
+        """
+        self.filename = filename
+        self.header = list(header)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+
+        self.queue = Queue(maxsize=max_queue)
+        self.file = None
+        self.opened_day = None
+        # Bytes in the active file, counted as rows are written (file.tell() would flush the buffer)
+        self.size = 0
+        self.row_buffer = io.StringIO()
+        self.row_writer = csv.writer(self.row_buffer)
+        self.thread = None
+        self.running = False
+
+        # Stats
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.rotations = 0
+
+    def start(self):
+        """Open the file and start the writer thread"""
+        if self.running:
+            return
+        self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Write everything still queued, flush and close"""
+        if not self.running:
+            return
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout=30)
+
+    def write(self, row):
+        """Queue one row; never blocks the caller"""
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except Full:
+            self.rows_dropped += 1
+            return False
+
+    def open(self):
+        """Open the active file for appending, starting a new one if the old one doesn't fit"""
+        if os.path.exists(self.filename) and os.path.getsize(self.filename) > 0:
+            with open(self.filename, 'r', newline='') as f:
+                existing_header = next(csv.reader(f), None)
+
+            file_day = datetime.fromtimestamp(os.path.getmtime(self.filename)).date()
+            if existing_header != self.header:
+                print(f"⚠️ {self.filename} has different columns, starting a new file")
+                self.rotate_file()
+            elif self.rotate_daily and file_day != datetime.now().date():
+                self.rotate_file()
+
+        self.size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        self.file = open(self.filename, 'a', newline='', buffering=1024 * 1024)
+        self.opened_day = datetime.now().date()
+
+        if not self.size:
+            self.write_row(self.header)
+
+    def write_row(self, row):
+        """Format one row and append it to the buffered handle, keeping the byte count"""
+        self.row_buffer.seek(0)
+        self.row_buffer.truncate()
+        self.row_writer.writerow(row)
+        line = self.row_buffer.getvalue()
+        self.file.write(line)
+        self.size += len(line.encode(self.file.encoding or 'utf-8'))
+
+    def rotate_file(self):
+        """Move the active file aside (and compress it if configured)"""
+        base, extension = os.path.splitext(self.filename)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        rotated = f"{base}.{stamp}{extension}"
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + '.gz'):
+            rotated = f"{base}.{stamp}_{suffix}{extension}"
+            suffix += 1
+        os.replace(self.filename, rotated)
+
+        if self.compress:
+            with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+            rotated += '.gz'
+
+        self.rotations += 1
+        print(f"🗂️ Rotated {self.filename} → {rotated}")
+
+    def needs_rotation(self):
+        if self.rotate_daily and datetime.now().date() != self.opened_day:
+            return True
+        return self.max_bytes is not None and self.size >= self.max_bytes
+
+    def rotate(self):
+        self.file.close()
+        self.rotate_file()
+        self.open()
+
+    def write_rows(self, rows):
+        """Write rows into the buffered handle (writer thread only, or without start())"""
+        for row in rows:
+            if self.needs_rotation():
+                self.rotate()
+            self.write_row(row)
+        self.rows_written += len(rows)
+
+    def flush(self):
+        self.file.flush()
+        self.flushes += 1
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def _run(self):
+        """Writer loop: batch rows into the buffered handle and flush on thresholds"""
+        pending = 0
+        last_flush = time.time()
+
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.time() - last_flush))
+            try:
+                row = self.queue.get(timeout=timeout)
+            except Empty:
+                row = False
+
+            if row is None:
+                break
+
+            if row is not False:
+                self.write_rows([row])
+                pending += 1
+
+            if pending and (pending >= self.flush_rows or time.time() - last_flush >= self.flush_interval):
+                self.flush()
+                pending = 0
+            if not pending:
+                last_flush = time.time()
+
+        # Shutdown: drain what is left, then flush and close
+        while True:
+            try:
+                row = self.queue.get_nowait()
+            except Empty:
+                break
+            if row is not None:
+                self.write_rows([row])
+
+        self.close()
+
+    def get_stats(self):
+        """Return sink statistics"""
+        return {
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'flushes': self.flushes,
+            'rotations': self.rotations,
+            'queue_depth': self.queue.qsize()
+        }
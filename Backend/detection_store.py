@@ -0,0 +1,308 @@
+import argparse
+import csv
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from queue import Queue, Empty, Full
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    location TEXT NOT NULL,
+    source_type TEXT,
+    vehicle_count INTEGER NOT NULL,
+    person_count INTEGER NOT NULL,
+    total_objects INTEGER NOT NULL,
+    cars INTEGER NOT NULL DEFAULT 0,
+    motorcycles INTEGER NOT NULL DEFAULT 0,
+    buses INTEGER NOT NULL DEFAULT 0,
+    trucks INTEGER NOT NULL DEFAULT 0,
+    bicycles INTEGER NOT NULL DEFAULT 0,
+    traffic_level TEXT,
+    pedestrian_level TEXT,
+    noise_level_dbfs REAL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_location_time ON detections (location, timestamp);
+"""
+
+COLUMNS = [
+    'timestamp', 'location', 'source_type',
+    'vehicle_count', 'person_count', 'total_objects',
+    'cars', 'motorcycles', 'buses', 'trucks', 'bicycles',
+    'traffic_level', 'pedestrian_level', 'noise_level_dbfs'
+]
+
+INSERT = f"INSERT INTO detections ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# Timestamps are stored as local 'YYYY-mm-dd HH:MM:SS' text (same as the CSVs), so a bucket is a prefix
+BUCKET_LENGTHS = {
+    'minute': 16,
+    'hour': 13,
+    'day': 10
+}
+
+
+def format_timestamp(value):
+    """Accept a datetime, unix seconds or an already formatted string"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+def make_row(location, vehicle_count, person_count, vehicle_types, traffic_level, pedestrian_level,
+             noise_level=None, timestamp=None, source_type='youtube'):
+    """Build one COLUMNS tuple from a detection"""
+    return (
+        format_timestamp(timestamp if timestamp is not None else datetime.now()),
+        location,
+        source_type,
+        vehicle_count,
+        person_count,
+        vehicle_count + person_count,
+        vehicle_types.get('car', 0),
+        vehicle_types.get('motorcycle', 0),
+        vehicle_types.get('bus', 0),
+        vehicle_types.get('truck', 0),
+        vehicle_types.get('bicycle', 0),
+        traffic_level,
+        pedestrian_level,
+        noise_level
+    )
+
+
+def parse_csv_record(record):
+    """
+    Turn one csv.DictReader row into a COLUMNS tuple
+    Handles all three detections.csv layouts: multi_stream_detector.py (location), noize.py
+    (location + noise_level_dBFS) and 'saved py.py' (source_type + source_id, used as the location)
+    """
+    noise = record.get('noise_level_dBFS')
+    return (
+        record['timestamp'],
+        record.get('location') or record.get('source_id'),
+        record.get('source_type', 'youtube'),
+        int(record['vehicle_count']),
+        int(record['person_count']),
+        int(record['total_objects']),
+        int(record['cars']),
+        int(record['motorcycles']),
+        int(record['buses']),
+        int(record['trucks']),
+        int(record['bicycles']),
+        record['traffic_level'],
+        record['pedestrian_level'],
+        float(noise) if noise not in (None, '', 'None') else None
+    )
+
+
+class DetectionStore:
+    def __init__(self, db_file='detections.db', batch_size=500, flush_interval=2.0, max_queue=10000):
+        """
+        SQLite (WAL) store for detection history
+        Writes are queued and inserted by one writer thread in batched transactions;
+        queries open their own connection, which WAL lets run alongside the writer
+        db_file: database path
+        batch_size: max rows per transaction
+        flush_interval: max seconds a queued row waits before it is committed
+        """
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.queue = Queue(maxsize=max_queue)
+        self.thread = None
+        self.running = False
+
+        # Stats
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.commits = 0
+
+        with closing(self.connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ---------------------- WRITING ----------------------
+
+    def start(self):
+        """Start the writer thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Commit whatever is queued and stop"""
+        if not self.running:
+            return
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout=30)
+
+    def write(self, location, vehicle_count, person_count, vehicle_types, traffic_level, pedestrian_level,
+              noise_level=None, timestamp=None, source_type='youtube'):
+        """Queue one detection; never blocks the caller"""
+        row = make_row(location, vehicle_count, person_count, vehicle_types, traffic_level, pedestrian_level,
+                       noise_level, timestamp, source_type)
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except Full:
+            self.rows_dropped += 1
+            return False
+
+    def _run(self):
+        """Writer loop: one transaction per batch"""
+        conn = self.connect()
+        stopping = False
+
+        try:
+            while not stopping:
+                rows = []
+                deadline = time.time() + self.flush_interval
+                while len(rows) < self.batch_size:
+                    try:
+                        row = self.queue.get(timeout=max(0.0, deadline - time.time()))
+                    except Empty:
+                        break
+                    if row is None:
+                        stopping = True
+                        break
+                    rows.append(row)
+
+                if not rows:
+                    continue
+
+                try:
+                    with conn:
+                        conn.executemany(INSERT, rows)
+                    self.rows_written += len(rows)
+                    self.commits += 1
+                except sqlite3.Error as e:
+                    print(f"❌ SQLite write error ({len(rows)} rows): {e}")
+        finally:
+            conn.close()
+
+    def get_stats(self):
+        """Return writer statistics"""
+        return {
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'commits': self.commits,
+            'queue_depth': self.queue.qsize()
+        }
+
+    # ---------------------- QUERIES ----------------------
+
+    def locations(self):
+        """All locations that have history"""
+        with closing(self.connect()) as conn:
+            return [row[0] for row in conn.execute('SELECT DISTINCT location FROM detections ORDER BY location')]
+
+    def query(self, location, start, end, limit=None):
+        """Raw detections for one location with start <= timestamp < end, oldest first"""
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM detections "
+               "WHERE location = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp")
+        params = [location, format_timestamp(start), format_timestamp(end)]
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with closing(self.connect()) as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def aggregate(self, location, start, end, bucket=None):
+        """
+        Summary of one location over start <= timestamp < end
+        bucket: None for a single summary, or 'minute'/'hour'/'day' for one row per bucket
+        """
+        group = f"substr(timestamp, 1, {BUCKET_LENGTHS[bucket]})" if bucket else "''"
+        sql = f"""
+            SELECT {group} AS bucket,
+                   COUNT(*) AS samples,
+                   AVG(vehicle_count) AS vehicle_mean,
+                   MAX(vehicle_count) AS vehicle_max,
+                   AVG(person_count) AS person_mean,
+                   MAX(person_count) AS person_max,
+                   SUM(cars) AS cars,
+                   SUM(motorcycles) AS motorcycles,
+                   SUM(buses) AS buses,
+                   SUM(trucks) AS trucks,
+                   SUM(bicycles) AS bicycles,
+                   AVG(noise_level_dbfs) AS noise_mean
+            FROM detections
+            WHERE location = ? AND timestamp >= ? AND timestamp < ?
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+
+        with closing(self.connect()) as conn:
+            rows = [dict(row) for row in conn.execute(sql, (location, format_timestamp(start), format_timestamp(end)))]
+
+        if not bucket:
+            return rows[0] if rows else None
+        return rows
+
+    # ---------------------- IMPORT ----------------------
+
+    def import_csv(self, csv_file, chunk_size=5000):
+        """Import an existing detections CSV (any layout); rows are inserted as-is, so import each file once"""
+        imported = 0
+
+        with open(csv_file, 'r', newline='') as f, closing(self.connect()) as conn, conn:
+            reader = csv.DictReader(f)
+            rows = []
+
+            for record in reader:
+                rows.append(parse_csv_record(record))
+
+                if len(rows) >= chunk_size:
+                    conn.executemany(INSERT, rows)
+                    imported += len(rows)
+                    rows = []
+
+            if rows:
+                conn.executemany(INSERT, rows)
+                imported += len(rows)
+
+        print(f"✅ Imported {imported} rows from {csv_file} into {self.db_file}")
+        return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CitySense detection history store")
+    parser.add_argument('--db', default='detections.db', help="SQLite database file")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="Import detection CSVs")
+    import_parser.add_argument('csv_files', nargs='+')
+
+    query_parser = commands.add_parser('query', help="Aggregate one location over a time range")
+    query_parser.add_argument('location')
+    query_parser.add_argument('start', help="'YYYY-mm-dd HH:MM:SS'")
+    query_parser.add_argument('end', help="'YYYY-mm-dd HH:MM:SS'")
+    query_parser.add_argument('--bucket', choices=list(BUCKET_LENGTHS))
+
+    args = parser.parse_args()
+    store = DetectionStore(args.db)
+
+    if args.command == 'import':
+        for csv_file in args.csv_files:
+            store.import_csv(csv_file)
+    else:
+        result = store.aggregate(args.location, args.start, args.end, args.bucket)
+        for row in (result if isinstance(result, list) else [result]):
+            print(row)
@@ -0,0 +1,141 @@
+import os
+import select
+import shutil
+import subprocess
+
+import numpy as np
+
+
+class FFmpegPipeCapture:
+    # select() only accepts sockets on Windows, so there the pipe can't be polled
+    CAN_POLL = os.name != 'nt'
+
+    def __init__(self, stream_url, width=416, height=416, fps=1.0, keyframes_only=False, ffmpeg_path=None,
+                 num_buffers=3):
+        """
+        Minimal cv2.VideoCapture replacement backed by an ffmpeg subprocess
+        ffmpeg decimates to `fps`, scales straight to width x height and writes raw BGR
+        frames to a pipe, which are read into preallocated NumPy buffers
+        keyframes_only: tell the decoder to skip all non-keyframes (-skip_frame nokey)
+        num_buffers: buffers grab() cycles through, so a retrieved frame stays valid
+                     while the next num_buffers - 1 frames are read
+        """
+        self.stream_url = stream_url
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.keyframes_only = keyframes_only
+        self.ffmpeg_path = ffmpeg_path or shutil.which('ffmpeg')
+
+        self.frame_size = width * height * 3
+        self.frames = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(num_buffers)]
+        self.buffers = [memoryview(frame.reshape(-1)) for frame in self.frames]
+        self.current = 0
+        self.has_frame = False
+        self.process = None
+
+        if self.ffmpeg_path:
+            self.open()
+
+    @staticmethod
+    def is_available():
+        """Check whether an ffmpeg binary is on PATH"""
+        return shutil.which('ffmpeg') is not None
+
+    def build_command(self):
+        """Build the ffmpeg command line for this stream"""
+        cmd = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin']
+
+        if self.stream_url.startswith('http'):
+            cmd += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+
+        # Decoder option, has to come before -i
+        if self.keyframes_only:
+            cmd += ['-skip_frame', 'nokey']
+
+        filters = []
+        if self.fps:
+            filters.append(f'fps={self.fps}')
+        filters.append(f'scale={self.width}:{self.height}')
+
+        cmd += [
+            '-i', self.stream_url,
+            '-an', '-sn',
+            '-vf', ','.join(filters),
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            'pipe:1'
+        ]
+        return cmd
+
+    def open(self):
+        """Start the ffmpeg process"""
+        try:
+            self.process = subprocess.Popen(
+                self.build_command(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0
+            )
+        except OSError as e:
+            print(f"❌ Failed to start ffmpeg: {e}")
+            self.process = None
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def set(self, prop_id, value):
+        """Capture properties are controlled through the ffmpeg command line"""
+        return False
+
+    def frame_ready(self):
+        """
+        True when ffmpeg has already written data, i.e. grab() won't wait for the stream
+        Always False where the pipe can't be polled (CAN_POLL); callers fall back to blocking grabs
+        """
+        if self.process is None or not self.CAN_POLL:
+            return False
+        readable, _, _ = select.select([self.process.stdout], [], [], 0)
+        return bool(readable)
+
+    def grab(self):
+        """Read the next raw frame from the pipe into the next preallocated buffer"""
+        if self.process is None:
+            return False
+
+        self.current = (self.current + 1) % len(self.frames)
+        buffer = self.buffers[self.current]
+
+        pipe = self.process.stdout
+        offset = 0
+        while offset < self.frame_size:
+            n = pipe.readinto(buffer[offset:])
+            if not n:
+                self.has_frame = False
+                return False
+            offset += n
+
+        self.has_frame = True
+        return True
+
+    def retrieve(self):
+        """Return the last grabbed frame (its buffer is reused num_buffers grabs later)"""
+        if not self.has_frame:
+            return False, None
+        return True, self.frames[self.current]
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        """Stop the ffmpeg process"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdout.close()
+        except Exception:
+            pass
+        self.process.kill()
+        self.process.wait()
+        self.process = None
@@ -0,0 +1,191 @@
+import threading
+import time
+from queue import Queue, Empty, Full
+
+
+class FirebaseBatchWriter:
+    def __init__(self, db_ref, flush_interval=2.0, max_queue=10000, max_batch=1000, spool=None,
+                 reconnect=None, reconnect_interval=30.0):
+        """
+        Background Firebase sink that batches records from all locations
+        Every flush_interval seconds the queued records go out as one multi-path update():
+        each record under locations/<name>/detections/<key>, plus one coalesced
+        locations/<name>/latest per location (only the newest detection of the batch)
+        While Firebase is unreachable, records go to the spool instead
+        max_queue: bounded queue size; records arriving when it is full are dropped
+        max_batch: max records per update() call
+        spool: optional Spool that keeps records which couldn't be sent (otherwise they are lost)
+        reconnect: optional callable() -> db_ref or None, retried every reconnect_interval
+                   seconds while there is no connection
+        """
+        self.db_ref = db_ref
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.spool = spool
+        self.reconnect = reconnect
+        self.reconnect_interval = reconnect_interval
+        self.last_reconnect = time.time()
+        self.failing = False
+
+        self.queue = Queue(maxsize=max_queue)
+        self.running = False
+        self.thread = None
+
+        # Metrics
+        self.stats_lock = threading.Lock()
+        self.flushes = 0
+        self.records_written = 0
+        self.records_dropped = 0
+        self.errors = 0
+        self.records_spooled = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+        self.max_queue_depth = 0
+
+    def start(self):
+        """Start the background flush thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Flush whatever is queued and stop"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 30)
+
+    def write(self, location_name, timestamp_key, data, node='detections'):
+        """
+        Queue one record for locations/<name>/<node>/<key>; never blocks the caller
+        Only 'detections' records update 'latest'
+        """
+        try:
+            self.queue.put_nowait((location_name, node, timestamp_key, data))
+        except Full:
+            with self.stats_lock:
+                self.records_dropped += 1
+            return False
+
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def _drain(self):
+        """Take up to max_batch records off the queue"""
+        records = []
+        while len(records) < self.max_batch:
+            try:
+                records.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return records
+
+    def build_update(self, records, update_latest=True):
+        """Build one fan-out update with a coalesced 'latest' per location"""
+        updates = {}
+        latest = {}
+
+        for location_name, node, timestamp_key, data in records:
+            updates[f"locations/{location_name}/{node}/{timestamp_key}"] = data
+            if node == 'detections' and update_latest:
+                latest[location_name] = data
+
+        for location_name, data in latest.items():
+            updates[f"locations/{location_name}/latest"] = data
+
+        return updates
+
+    def is_online(self):
+        """Connected and the last flush went through"""
+        return self.db_ref is not None and not self.failing
+
+    def try_reconnect(self):
+        if self.reconnect is None or time.time() - self.last_reconnect < self.reconnect_interval:
+            return
+        self.last_reconnect = time.time()
+        self.db_ref = self.reconnect()
+
+    def spool_records(self, records):
+        """Keep undeliverable records on disk for the replayer"""
+        if self.spool is None:
+            return
+        try:
+            self.spool.append([list(record) for record in records])
+            with self.stats_lock:
+                self.records_spooled += len(records)
+        except Exception as e:
+            print(f"❌ Spool write error, {len(records)} records lost: {e}")
+
+    def replay(self, records):
+        """Send spooled records; 'latest' is left alone so old data never overwrites it"""
+        if self.db_ref is None:
+            raise ConnectionError("Firebase is not connected")
+        self.db_ref.update(self.build_update(records, update_latest=False))
+
+    def flush(self):
+        """Send everything currently queued, in max_batch sized updates"""
+        if self.db_ref is None:
+            self.try_reconnect()
+        offline = self.db_ref is None
+
+        while True:
+            records = self._drain()
+            if not records:
+                return
+
+            # Once a write failed, the rest of this flush goes straight to the spool
+            if offline:
+                self.spool_records(records)
+                continue
+
+            start = time.time()
+            try:
+                self.db_ref.update(self.build_update(records))
+            except Exception as e:
+                if not self.failing:
+                    print(f"❌ Firebase batch write error ({len(records)} records), spooling until it recovers: {e}")
+                self.failing = True
+                offline = True
+                with self.stats_lock:
+                    self.errors += 1
+                self.spool_records(records)
+                continue
+
+            if self.failing:
+                print("✅ Firebase writes recovered")
+                self.failing = False
+
+            latency = time.time() - start
+            with self.stats_lock:
+                self.flushes += 1
+                self.records_written += len(records)
+                self.last_flush_latency = latency
+                self.total_flush_latency += latency
+
+    def _run(self):
+        """Flush loop"""
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+        # Final flush on shutdown
+        self.flush()
+
+    def get_stats(self):
+        """Return writer metrics"""
+        with self.stats_lock:
+            avg_latency = self.total_flush_latency / self.flushes if self.flushes else 0
+            return {
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'flushes': self.flushes,
+                'records_written': self.records_written,
+                'records_dropped': self.records_dropped,
+                'errors': self.errors,
+                'records_spooled': self.records_spooled,
+                'last_flush_latency': self.last_flush_latency,
+                'avg_flush_latency': avg_latency
+            }
@@ -0,0 +1,53 @@
+import threading
+import time
+
+
+class LatestFrameSlot:
+    def __init__(self):
+        """
+        Single-slot frame buffer between a stream's reader thread and its analyzer
+        The reader overwrites the slot with every new frame; the analyzer always gets the
+        newest one. Frames replaced before the analyzer picked them up count as stale drops.
+        """
+        self.condition = threading.Condition()
+        self.frame = None
+        self.captured_at = 0.0
+        self.seq = 0
+        self.consumed_seq = 0
+        self.closed = False
+
+        # Stats
+        self.published = 0
+        self.stale_dropped = 0
+
+    def publish(self, frame):
+        """Replace the slot contents with a new frame (never blocks on the analyzer)"""
+        with self.condition:
+            if self.seq > self.consumed_seq:
+                self.stale_dropped += 1
+
+            self.frame = frame
+            self.captured_at = time.time()
+            self.seq += 1
+            self.published += 1
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Wait for a frame newer than the last one returned
+        Returns (seq, frame, captured_at), or None on timeout or when the slot is closed
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq > self.consumed_seq or self.closed, timeout):
+                return None
+            if self.seq <= self.consumed_seq:
+                return None
+
+            self.consumed_seq = self.seq
+            return self.seq, self.frame, self.captured_at
+
+    def close(self):
+        """Wake up the analyzer and tell it no more frames are coming"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
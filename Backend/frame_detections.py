@@ -0,0 +1,129 @@
+import numpy as np
+
+
+# One row per kept detection (after NMS); 20 bytes, no Python objects
+DETECTION_DTYPE = np.dtype([
+    ('x', np.int32),
+    ('y', np.int32),
+    ('w', np.int32),
+    ('h', np.int32),
+    ('confidence', np.float32),
+    ('class_id', np.int32)
+])
+
+
+def decode_yolo_outputs(outs, width, height, confidence_threshold):
+    """
+    Decode raw YOLO output layers in one vectorized pass
+    Returns (boxes, confidences, class_ids) as NumPy arrays ready for cv2.dnn.NMSBoxes
+    """
+    detections = np.concatenate([out.reshape(-1, out.shape[-1]) for out in outs], axis=0)
+    scores = detections[:, 5:]
+
+    # Threshold on the best class score first so argmax only runs on candidates
+    confidences = scores.max(axis=1)
+    mask = confidences > confidence_threshold
+    detections = detections[mask]
+    confidences = confidences[mask].astype(np.float32)
+    class_ids = scores[mask].argmax(axis=1)
+
+    # Same truncation as the per-row int() conversion
+    center_x = np.trunc(detections[:, 0] * width)
+    center_y = np.trunc(detections[:, 1] * height)
+    w = np.trunc(detections[:, 2] * width)
+    h = np.trunc(detections[:, 3] * height)
+    x = np.trunc(center_x - w / 2)
+    y = np.trunc(center_y - h / 2)
+
+    boxes = np.stack([x, y, w, h], axis=1).astype(np.int32)
+
+    return boxes, confidences, class_ids
+
+
+class FrameDetections:
+    __slots__ = ('array',)
+
+    def __init__(self, array=None):
+        """One frame's detections, backed by a DETECTION_DTYPE structured array"""
+        self.array = array if array is not None else np.empty(0, dtype=DETECTION_DTYPE)
+
+    @classmethod
+    def from_nms(cls, boxes, confidences, class_ids, indexes):
+        """Keep only the rows cv2.dnn.NMSBoxes selected"""
+        keep = np.asarray(indexes, dtype=np.int64).reshape(-1)
+        array = np.empty(len(keep), dtype=DETECTION_DTYPE)
+        if len(keep):
+            boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)[keep]
+            array['x'] = boxes[:, 0]
+            array['y'] = boxes[:, 1]
+            array['w'] = boxes[:, 2]
+            array['h'] = boxes[:, 3]
+            array['confidence'] = np.asarray(confidences, dtype=np.float32)[keep]
+            array['class_id'] = np.asarray(class_ids)[keep]
+        return cls(array)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(np.frombuffer(data, dtype=DETECTION_DTYPE).copy())
+
+    def to_bytes(self):
+        return self.array.tobytes()
+
+    def __len__(self):
+        return len(self.array)
+
+    @property
+    def class_ids(self):
+        return self.array['class_id']
+
+    @property
+    def confidences(self):
+        return self.array['confidence']
+
+    @property
+    def boxes(self):
+        """(N, 4) int32 x, y, w, h"""
+        return np.stack([self.array['x'], self.array['y'], self.array['w'], self.array['h']], axis=1)
+
+    def scaled(self, scale_x, scale_y):
+        """Copy with boxes mapped to another resolution (e.g. the full-size display frame)"""
+        array = self.array.copy()
+        array['x'] = (array['x'] * scale_x).astype(np.int32)
+        array['w'] = (array['w'] * scale_x).astype(np.int32)
+        array['y'] = (array['y'] * scale_y).astype(np.int32)
+        array['h'] = (array['h'] * scale_y).astype(np.int32)
+        return FrameDetections(array)
+
+
+class ClassCategories:
+    def __init__(self, classes, vehicle_classes, person_class):
+        """
+        Precomputed class id -> category lookup so counting is a single np.bincount
+        Categories 0..len(vehicle_classes)-1 are the vehicle classes, the next one is people;
+        every other class (and ids outside the class list) maps to -1 and isn't counted
+        """
+        self.vehicle_classes = list(vehicle_classes)
+        self.person_category = len(self.vehicle_classes)
+        self.num_categories = self.person_category + 1
+
+        self.lut = np.full(len(classes), -1, dtype=np.int64)
+        for class_id, class_name in enumerate(classes):
+            if class_name in self.vehicle_classes:
+                self.lut[class_id] = self.vehicle_classes.index(class_name)
+            elif class_name == person_class:
+                self.lut[class_id] = self.person_category
+
+    def count(self, detections):
+        """(vehicle_count, person_count, vehicle_types) for one frame"""
+        class_ids = detections.class_ids
+        class_ids = class_ids[(class_ids >= 0) & (class_ids < len(self.lut))]
+        categories = self.lut[class_ids]
+        counts = np.bincount(categories[categories >= 0], minlength=self.num_categories)
+
+        vehicle_counts = counts[:self.person_category]
+        vehicle_types = {
+            class_name: int(count)
+            for class_name, count in zip(self.vehicle_classes, vehicle_counts)
+            if count
+        }
+        return int(vehicle_counts.sum()), int(counts[self.person_category]), vehicle_types
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+from frame_detections import FrameDetections
+
+
+class FramePreprocessor:
+    def __init__(self, input_size=(416, 416), letterbox=False, pad_value=114):
+        """
+        Turns source frames into network input with one resize and no per-frame allocations
+        Each frame is resized straight to the network size into a reused uint8 buffer, then
+        converted (BGR -> RGB, 0..1) into a reused float32 NCHW blob. Boxes found in network
+        coordinates are mapped back to the source frame analytically.
+        One instance per stream; the blob is overwritten by the next frame, so a stream must
+        finish inference on a frame before preprocessing the next one.
+        input_size: network input (width, height)
+        letterbox: keep the aspect ratio and pad instead of stretching
+        pad_value: gray level of the letterbox padding
+        """
+        self.input_size = tuple(input_size)
+        self.letterbox = letterbox
+        self.pad_value = pad_value
+
+        width, height = self.input_size
+        self.blob = np.empty((1, 3, height, width), dtype=np.float32)
+        self.scale = np.float32(1 / 255.0)
+
+        # Geometry of the current source size, recomputed only when it changes
+        self.source_shape = None
+        self.resized = None
+        self.region = None
+        self.scale_x = self.scale_y = 1.0
+        self.pad_x = self.pad_y = 0
+
+    def set_geometry(self, source_height, source_width):
+        """Work out the resize target and padding for a new source frame size"""
+        width, height = self.input_size
+
+        if self.letterbox:
+            ratio = min(width / source_width, height / source_height)
+            resized_width = min(width, round(source_width * ratio))
+            resized_height = min(height, round(source_height * ratio))
+            self.scale_x = self.scale_y = ratio
+            self.pad_x = (width - resized_width) // 2
+            self.pad_y = (height - resized_height) // 2
+
+            # Padding never changes between frames of the same size, so fill it once
+            self.blob.fill(self.pad_value / 255.0)
+        else:
+            resized_width, resized_height = width, height
+            self.scale_x = width / source_width
+            self.scale_y = height / source_height
+            self.pad_x = self.pad_y = 0
+
+        self.resized = np.empty((resized_height, resized_width, 3), dtype=np.uint8)
+        self.region = self.blob[0, :, self.pad_y:self.pad_y + resized_height, self.pad_x:self.pad_x + resized_width]
+        self.source_shape = (source_height, source_width)
+
+    def __call__(self, frame):
+        """Preprocess a BGR frame; returns the (reused) 1x3xHxW float32 blob"""
+        source_height, source_width = frame.shape[:2]
+        if (source_height, source_width) != self.source_shape:
+            self.set_geometry(source_height, source_width)
+
+        # Frames that already come at the target size (ffmpeg ingest) skip the resize
+        if self.resized.shape[:2] == (source_height, source_width):
+            image = frame
+        else:
+            image = cv2.resize(frame, (self.resized.shape[1], self.resized.shape[0]), dst=self.resized)
+
+        # HWC BGR uint8 -> CHW RGB float32 in one pass, written into the blob in place
+        np.multiply(image.transpose(2, 0, 1)[::-1], self.scale, out=self.region)
+        return self.blob
+
+    def to_source(self, detections):
+        """Map detections from network coordinates back to the last preprocessed frame"""
+        array = detections.array.copy()
+        array['x'] = ((array['x'] - self.pad_x) / self.scale_x).astype(np.int32)
+        array['y'] = ((array['y'] - self.pad_y) / self.scale_y).astype(np.int32)
+        array['w'] = (array['w'] / self.scale_x).astype(np.int32)
+        array['h'] = (array['h'] / self.scale_y).astype(np.int32)
+        return FrameDetections(array)
@@ -0,0 +1,138 @@
+import threading
+import time
+from queue import Queue, Empty
+
+
+class InferenceRequest:
+    """A single frame waiting for inference, plus the slot its result is written to"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceScheduler:
+    def __init__(self, run_batch, max_batch_size=8, max_wait=0.05):
+        """
+        Gathers pending frames from all streams and runs them through the network together
+        run_batch: callable taking a list of frames and returning one result per frame
+        max_batch_size: largest number of frames sent in one forward pass
+        max_wait: seconds to wait for more frames after the first one arrives
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.requests = Queue()
+        self.running = False
+        self.thread = None
+        # Orders submit() against stop(), so nothing is queued after the final drain
+        self.lock = threading.Lock()
+
+        # Stats
+        self.batch_count = 0
+        self.frame_count = 0
+        self.busy_time = 0.0
+
+    def start(self):
+        """Start the scheduler thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread after the current batch; frames still queued fail"""
+        with self.lock:
+            self.running = False
+            self.requests.put(None)
+        if self.thread:
+            self.thread.join(timeout=5)
+        else:
+            self._fail_queued()
+
+    def submit(self, frame):
+        """Queue a frame for the next batch and block until its result is ready"""
+        request = InferenceRequest(frame)
+        with self.lock:
+            if not self.running:
+                raise RuntimeError('scheduler stopped')
+            self.requests.put(request)
+        request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+
+        return request.result
+
+    def _collect_batch(self, first):
+        """Gather up to max_batch_size requests, waiting at most max_wait after the first"""
+        batch = [first]
+        deadline = time.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except Empty:
+                break
+            if request is None:
+                self.running = False
+                break
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        """Scheduler loop: collect, forward once, scatter results"""
+        while self.running:
+            first = self.requests.get()
+            if first is None:
+                break
+
+            batch = self._collect_batch(first)
+            start = time.time()
+
+            try:
+                results = self.run_batch([request.frame for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+
+            self.busy_time += time.time() - start
+            self.batch_count += 1
+            self.frame_count += len(batch)
+
+            for request in batch:
+                request.done.set()
+
+        self._fail_queued()
+
+    def _fail_queued(self):
+        """Wake every request left behind the stop sentinel with an error"""
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except Empty:
+                break
+            if request is not None:
+                request.error = RuntimeError('scheduler stopped')
+                request.done.set()
+
+    def get_stats(self):
+        """Return batching statistics"""
+        avg_batch = self.frame_count / self.batch_count if self.batch_count else 0
+        avg_latency = self.busy_time / self.batch_count if self.batch_count else 0
+        return {
+            'batches': self.batch_count,
+            'frames': self.frame_count,
+            'avg_batch_size': avg_batch,
+            'avg_batch_time': avg_latency
+        }
@@ -0,0 +1,250 @@
+import multiprocessing as mp
+import itertools
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Queue, Empty
+
+import numpy as np
+
+from inference_scheduler import InferenceRequest
+from frame_detections import FrameDetections, decode_yolo_outputs
+
+
+def _worker_main(worker_id, model_type, input_size, shm_names, confidence_threshold, nms_threshold,
+                 cv_threads, task_queue, result_queue):
+    """Inference worker process: owns its own copy of the net, reads blobs from shared memory"""
+    import cv2
+
+    # Keep OpenCV from spawning one thread per core in every worker
+    cv2.setNumThreads(cv_threads)
+    width, height = input_size
+
+    if model_type == 'yolov4-tiny':
+        net = cv2.dnn.readNet("yolov4-tiny.weights", "yolov4-tiny.cfg")
+    else:
+        net = cv2.dnn.readNet("yolov4.weights", "yolov4.cfg")
+
+    layer_names = net.getLayerNames()
+    output_layers = [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
+
+    slots = [shared_memory.SharedMemory(name=name) for name in shm_names]
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+
+            slot, seq, shape = task
+            try:
+                # View into the shared buffer, no copy and no pickling of the blob
+                blob = np.ndarray(shape, dtype=np.float32, buffer=slots[slot].buf)
+                net.setInput(blob)
+                outs = net.forward(output_layers)
+
+                # Boxes stay in network coordinates; the submitting stream maps them back
+                boxes, confidences, class_ids = decode_yolo_outputs(outs, width, height, confidence_threshold)
+                indexes = cv2.dnn.NMSBoxes(boxes, confidences, confidence_threshold, nms_threshold)
+
+                # Only the kept detections travel back, as raw structured-array bytes
+                detections = FrameDetections.from_nms(boxes, confidences, class_ids, indexes)
+                result_queue.put((slot, seq, detections.to_bytes(), None))
+            except Exception as e:
+                result_queue.put((slot, seq, None, f"worker {worker_id}: {e}"))
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+class InferenceWorkerPool:
+    def __init__(self, model_type='yolov4-tiny', num_workers=None, slots_per_worker=2, input_size=(416, 416),
+                 confidence_threshold=0.4, nms_threshold=0.4, request_timeout=30.0, health_interval=1.0):
+        """
+        Runs inference in K worker processes, each with its own copy of the net
+        Preprocessed blobs are handed over through multiprocessing.shared_memory slots; only the
+        slot index and blob shape travel on the task queue, detections come back on a result queue
+        num_workers: worker processes (default: one per 4 cores)
+        slots_per_worker: shared blob buffers per worker, bounds in-flight frames
+        input_size: network input (width, height); each slot holds one 1x3xHxW float32 blob
+        request_timeout: seconds submit() waits for a result before failing the frame
+        health_interval: seconds between worker liveness checks; a dead worker is respawned and
+                         every frame in flight fails (its result may never come)
+        """
+        cpu_count = os.cpu_count() or 1
+        self.model_type = model_type
+        self.input_size = tuple(input_size)
+        self.num_workers = num_workers or max(1, cpu_count // 4)
+        self.num_slots = self.num_workers * slots_per_worker
+        self.slot_size = 3 * self.input_size[0] * self.input_size[1] * np.dtype(np.float32).itemsize
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.cv_threads = max(1, cpu_count // self.num_workers)
+        self.request_timeout = request_timeout
+        self.health_interval = health_interval
+
+        self.ctx = mp.get_context('spawn')
+        self.slots = [shared_memory.SharedMemory(create=True, size=self.slot_size) for _ in range(self.num_slots)]
+
+        self.free_slots = Queue()
+        for slot in range(self.num_slots):
+            self.free_slots.put(slot)
+
+        # Slot -> request in flight; results carry the request's seq so a late result for a
+        # failed request is never handed to the next user of the slot
+        self.pending = {}
+        self.seq = itertools.count()
+        self.task_queue = self.ctx.Queue()
+        self.result_queue = self.ctx.Queue()
+        self.workers = []
+        self.dispatcher = None
+        self.running = False
+
+        # Stats
+        self.frame_count = 0
+        self.busy_time = 0.0
+        self.failed = 0
+        self.restarts = 0
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        """Spawn worker processes and the result dispatcher thread"""
+        if self.running:
+            return
+        self.running = True
+
+        for worker_id in range(self.num_workers):
+            self.workers.append(self.spawn_worker(worker_id))
+
+        self.dispatcher = threading.Thread(target=self._dispatch_results, daemon=True)
+        self.dispatcher.start()
+
+        print(f"⚙️ Started {self.num_workers} inference workers ({self.num_slots} shared blob slots)")
+
+    def spawn_worker(self, worker_id):
+        """Start one worker process"""
+        worker = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.model_type, self.input_size, [shm.name for shm in self.slots],
+                  self.confidence_threshold, self.nms_threshold, self.cv_threads, self.task_queue,
+                  self.result_queue),
+            daemon=True
+        )
+        worker.start()
+        return worker
+
+    def stop(self):
+        """Stop workers and release shared memory"""
+        if not self.running:
+            return
+        self.running = False
+
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+        self.result_queue.put(None)
+        if self.dispatcher:
+            self.dispatcher.join(timeout=5)
+        self.fail_pending("inference pool stopped")
+
+        for shm in self.slots:
+            shm.close()
+            shm.unlink()
+
+    def submit(self, blob):
+        """Copy a preprocessed blob into a free shared slot, queue it for a worker and block until done"""
+        if blob.dtype != np.float32 or blob.nbytes > self.slot_size:
+            raise ValueError(f"Blob {blob.shape} {blob.dtype} does not fit a {self.slot_size}-byte slot")
+
+        if not self.running:
+            raise RuntimeError("inference pool is not running")
+
+        slot = self.free_slots.get()
+        start = time.time()
+
+        try:
+            view = np.ndarray(blob.shape, dtype=np.float32, buffer=self.slots[slot].buf)
+            np.copyto(view, blob)
+
+            request = InferenceRequest(None)
+            request.seq = next(self.seq)
+            self.pending[slot] = request
+            self.task_queue.put((slot, request.seq, blob.shape))
+            if not request.done.wait(self.request_timeout):
+                request.error = f"no result within {self.request_timeout:.0f}s"
+        finally:
+            self.pending.pop(slot, None)
+            self.free_slots.put(slot)
+
+        with self.stats_lock:
+            if request.error is not None:
+                self.failed += 1
+            else:
+                self.frame_count += 1
+                self.busy_time += time.time() - start
+
+        if request.error is not None:
+            raise RuntimeError(request.error)
+
+        return request.result
+
+    def fail_pending(self, error):
+        """Wake every submit() still waiting, with an error"""
+        for request in list(self.pending.values()):
+            if not request.done.is_set():
+                request.error = error
+                request.done.set()
+
+    def check_workers(self):
+        """Respawn dead workers; the frames in flight fail since a dead worker never answers"""
+        for worker_id, worker in enumerate(self.workers):
+            if worker.is_alive() or not self.running:
+                continue
+            print(f"⚠️ Inference worker {worker_id} died (exit code {worker.exitcode}), restarting")
+            self.fail_pending(f"worker {worker_id} died")
+            self.workers[worker_id] = self.spawn_worker(worker_id)
+            self.restarts += 1
+
+    def _dispatch_results(self):
+        """Route worker results back to the thread waiting on each slot and watch worker health"""
+        last_check = time.time()
+        while self.running:
+            try:
+                item = self.result_queue.get(timeout=self.health_interval)
+            except Empty:
+                item = False
+            if item is None:
+                break
+
+            if time.time() - last_check >= self.health_interval:
+                last_check = time.time()
+                self.check_workers()
+
+            if item is False:
+                continue
+
+            slot, seq, result, error = item
+            request = self.pending.get(slot)
+            if request is None or request.seq != seq:
+                continue
+
+            request.result = FrameDetections.from_bytes(result) if result is not None else None
+            request.error = error
+            request.done.set()
+
+    def get_stats(self):
+        """Return inference statistics (InferenceScheduler keys plus worker failures)"""
+        avg_time = self.busy_time / self.frame_count if self.frame_count else 0
+        return {
+            'batches': self.frame_count,
+            'frames': self.frame_count,
+            'avg_batch_size': 1.0 if self.frame_count else 0,
+            'avg_batch_time': avg_time,
+            'failed': self.failed,
+            'worker_restarts': self.restarts
+        }
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue, Empty, Full
+from urllib.parse import unquote, urlparse, parse_qs
+
+
+class LiveStateServer:
+    def __init__(self, host='127.0.0.1', port=8765, keepalive_interval=15.0, subscriber_queue=100):
+        """
+        Local HTTP API serving the detector's latest state straight from memory
+        GET /latest            all locations, {name: record}
+        GET /latest/<name>     one location's latest record
+        GET /events            Server-Sent Events, one 'detection' event per new record
+                               (?location=<name> to follow one location)
+        /latest responses carry an ETag; a matching If-None-Match gets an empty 304
+        keepalive_interval: seconds between SSE keepalive comments
+        subscriber_queue: events buffered per SSE client; a slow client loses the oldest
+        """
+        self.host = host
+        self.port = port
+        self.keepalive_interval = keepalive_interval
+        self.subscriber_queue = subscriber_queue
+
+        # ETags carry the server start time so a restart never revalidates stale client copies
+        self.instance = int(time.time())
+        self.lock = threading.Lock()
+        self.version = 0
+        self.latest = {}            # name -> (version, record, encoded body)
+        self.all_body = b'{}'
+        self.subscribers = set()
+
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Start serving in a background thread"""
+        handler = type('LiveStateHandler', (LiveStateHandler,), {'state': self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"🌐 Live API on http://{self.host}:{self.port} (/latest, /events)")
+
+    def stop(self):
+        """Stop serving and end every SSE stream"""
+        with self.lock:
+            for queue in self.subscribers:
+                self.offer(queue, None)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @staticmethod
+    def offer(queue, item):
+        """Put without blocking, dropping the oldest item if the client has fallen behind"""
+        while True:
+            try:
+                queue.put_nowait(item)
+                return
+            except Full:
+                try:
+                    queue.get_nowait()
+                except Empty:
+                    pass
+
+    def publish(self, location_name, record):
+        """Make record the location's latest state and push it to SSE clients"""
+        body = json.dumps(record).encode()
+
+        with self.lock:
+            self.version += 1
+            self.latest[location_name] = (self.version, record, body)
+            self.all_body = json.dumps({name: entry[1] for name, entry in self.latest.items()}).encode()
+
+            event = (self.version, location_name, body)
+            for queue in self.subscribers:
+                self.offer(queue, event)
+
+    def snapshot(self, location_name=None):
+        """(etag, body) for one location or for all of them; None if the location is unknown"""
+        with self.lock:
+            if location_name is None:
+                return f'"{self.instance}-{self.version}"', self.all_body
+            entry = self.latest.get(location_name)
+            if entry is None:
+                return None
+            return f'"{self.instance}-{entry[0]}"', entry[2]
+
+    def subscribe(self, last_event_id=0):
+        """Register an SSE client; returns its queue, pre-filled with anything newer than last_event_id"""
+        queue = Queue(maxsize=self.subscriber_queue)
+        with self.lock:
+            for name, (version, _, body) in sorted(self.latest.items(), key=lambda item: item[1][0]):
+                if version > last_event_id:
+                    self.offer(queue, (version, name, body))
+            self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            self.subscribers.discard(queue)
+
+
+class LiveStateHandler(BaseHTTPRequestHandler):
+    """Request handler; the server's LiveStateServer is attached as 'state'"""
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_common_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+
+        if parts and parts[0] == 'latest' and len(parts) <= 2:
+            self.send_latest(parts[1] if len(parts) == 2 else None)
+        elif parts == ['events']:
+            location_name = parse_qs(url.query).get('location', [None])[0]
+            self.send_events(location_name)
+        else:
+            self.send_error(404)
+
+    def send_latest(self, location_name):
+        result = self.state.snapshot(location_name)
+        if result is None:
+            self.send_error(404, f"Unknown location: {location_name}")
+            return
+
+        etag, body = result
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_common_headers()
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_common_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_events(self, location_name):
+        # Event ids are <instance>-<version>; after a restart the client gets the full state again
+        instance, _, version = self.headers.get('Last-Event-ID', '').partition('-')
+        last_event_id = int(version) if instance == str(self.state.instance) and version.isdigit() else 0
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'keep-alive')
+        self.send_common_headers()
+        self.end_headers()
+
+        queue = self.state.subscribe(last_event_id)
+        try:
+            while True:
+                try:
+                    event = queue.get(timeout=self.state.keepalive_interval)
+                except Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+                    continue
+
+                if event is None:
+                    break
+
+                version, name, body = event
+                if location_name is not None and name != location_name:
+                    continue
+
+                data = b'{"location": ' + json.dumps(name).encode() + b', "data": ' + body + b'}'
+                self.wfile.write(b'id: %d-%d\nevent: detection\ndata: %s\n\n' % (self.state.instance, version, data))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.state.unsubscribe(queue)
@@ -1,63 +1,175 @@
+import argparse
 import cv2
 import numpy as np
-import yt_dlp
-from collections import defaultdict
 import time
 import urllib.request
 import os
-import csv
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, db
 import threading
 from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from inference_scheduler import InferenceScheduler
+from inference_workers import InferenceWorkerPool
+from ffmpeg_capture import FFmpegPipeCapture
+from frame_buffer import LatestFrameSlot
+from stream_url_cache import StreamUrlCache
+from stream_registry import load_stream_registry, load_sink_settings, load_api_settings, resolve_config_path
+from stream_pool import StreamPool
+from firebase_writer import FirebaseBatchWriter
+from spool import Spool, SpoolReplayer
+from publish_policy import PublishPolicy
+from aggregator import BucketAggregator
+from csv_sink import CSVSink
+from detection_store import DetectionStore
+from live_api import LiveStateServer
+from frame_detections import FrameDetections, ClassCategories, decode_yolo_outputs
+from frame_preprocessor import FramePreprocessor
+from sinks import (DetectionRecord, SinkFanout, CSVRecordSink, FirebaseSink, SQLiteSink, HTTPSink,
+                   StdoutSink, RollupSink)
+
 
 class MultiStreamDetector:
-    def __init__(self, model_type='yolov4-tiny'):
+    def __init__(self, model_type='yolov4-tiny', max_batch_size=8, max_batch_wait=0.05,
+                 inference_mode=None, num_workers=None, config_file='locations.json', api_port=8765):
         """
         Multi-stream detector that connects to all YouTube feeds simultaneously
         model_type: 'yolov4-tiny' (faster) or 'yolov4' (more accurate)
+        max_batch_size: max frames from different streams combined into one forward pass
+        max_batch_wait: max seconds a frame waits for others to join its batch
+        inference_mode: 'batched' (one in-process net) or 'process' (a pool of worker processes);
+                        None takes the registry's scheduler.inference_mode
+        num_workers: worker processes for 'process' mode; None takes the registry's
+                     scheduler.num_workers (default: one per 4 cores)
+        config_file: stream registry (JSON, TOML or YAML) with locations and per-stream settings
+        api_port: port for the local live HTTP/SSE API (None to disable); the registry's 'api'
+                  section can override it and set the host (default 127.0.0.1)
         """
         self.model_type = model_type
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
         self.csv_file = 'detections.csv'
+        self.rollup_csv_file = 'rollups.csv'
+        self.db_file = 'detections.db'
+        self.spool_dir = 'spool'
+        
+        # Startup phase timings (seconds), filled in as each phase finishes
+        self.start_time = time.time()
+        self.startup_timings = {}
+        
+        # Load all locations and their per-stream settings from the registry
+        self.scheduler_settings, self.locations = load_stream_registry(config_file)
+        self.sink_settings = load_sink_settings(config_file)
+        self.api_settings = load_api_settings(config_file)
+        print(f"📋 Loaded {len(self.locations)} streams from {resolve_config_path(config_file)}")
+        
+        # Inference backend: constructor arguments win over the registry's scheduler section
+        self.inference_mode = inference_mode or self.scheduler_settings['inference_mode']
+        self.num_workers = num_workers or self.scheduler_settings['num_workers']
+        if self.inference_mode not in ('batched', 'process'):
+            raise ValueError(f"Unknown inference_mode '{self.inference_mode}' (use 'batched' or 'process')")
+        
+        # Resolved stream URLs, reused across reconnects and restarts
+        self.url_cache = StreamUrlCache()
+        self.url_cache.start_refresher()
+        self.url_check_interval = 30
+        
+        # Start resolving every stream URL right away so it overlaps with model loading;
+        # run_all_streams starts each stream as soon as its own URL is ready
+        self.url_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='url')
+        self.url_futures = {
+            location_key: self.url_executor.submit(
+                self.timed, f"url [{location_info['name']}]", self.get_youtube_stream, location_info['url']
+            )
+            for location_key, location_info in self.locations.items()
+        }
+        
+        # Classes we're interested in
+        self.vehicle_classes = ['car', 'motorcycle', 'bus', 'truck', 'bicycle']
+        self.person_class = 'person'
+        
+        # Detection thresholds
+        self.confidence_threshold = 0.4
+        self.nms_threshold = 0.4
         
-        # Initialize Firebase
-        self.init_firebase()
-        
-        # Define all locations with YouTube live feeds
-        self.locations = {
-            '1': {
-                'name': 'Canmore Alberta',
-                'url': 'https://www.youtube.com/watch?v=_0wPODlF9wU',
-                'description': 'Main Street Livecam, Canmore, Alberta'
-            },
-            '2': {
-                'name': 'Koh Samui Thailand',
-                'url': 'https://www.youtube.com/watch?v=VR-x3HdhKLQ',
-                'description': 'Bondi Aussie Bar & Grill | Chaweng'
-            },
-            '3': {
-                'name': 'Bangkok Thailand',
-                'url': 'https://www.youtube.com/live/UemFRPrl1hk',
-                'description': 'El Gaucho | Soi 11 | Sukhumvit Road'
-            },
-            '4': {
-                'name': '4 Corners Downtown',
-                'url': 'https://www.youtube.com/watch?v=ByED80IKdIU',
-                'description': '4 Corners Camera Downtown'
-            }
+        # Per-stream frame counters (grabbed vs actually decoded to BGR)
+        self.stream_stats = {}
+        
+        # Open captures for the worker pool, keyed by location
+        self.stream_states = {}
+        
+        # Set on shutdown; threads-mode reader and analyzer loops exit on it
+        self.stopping = threading.Event()
+        
+        # Decides which samples of each stream actually get published to Firebase
+        self.publish_policies = {
+            location_key: PublishPolicy(**location_info['publish'])
+            for location_key, location_info in self.locations.items()
         }
         
-        self.init_csv()
-        self.download_model_files()
+        # Minute/hour/day rollups per location, written out as each bucket closes
+        self.aggregator = BucketAggregator(self.write_rollup)
+        
+        # Latest state per location served from memory to local dashboards
+        self.live_api = None
+        api_port = self.api_settings['port'] or api_port
+        if api_port and any('http' in location_info['sinks'] for location_info in self.locations.values()):
+            live_api = LiveStateServer(host=self.api_settings['host'], port=api_port)
+            try:
+                live_api.start()
+                self.live_api = live_api
+            except OSError as e:
+                # e.g. the port is taken; detection runs on without the live API
+                print(f"⚠️ Live API disabled, could not listen on {self.api_settings['host']}:{api_port}: {e}")
+        
+        # A grab() slower than this means the decoder had to wait for the network,
+        # i.e. we've drained the buffered frames and reached the live edge
+        self.live_edge_grab_time = 0.02
+        self.max_drain_frames = 300
+        # Pool mode: how soon a stream with no new frame yet is looked at again (fraction of sample_interval)
+        self.not_ready_retry = 0.25
+        
+        # Default network input size; streams can override it with 'input_size'
+        self.input_size = (416, 416)
+        
+        # One resize straight into a reused blob per stream (a stream analyzes one frame at a time)
+        self.preprocessors = {
+            location_key: FramePreprocessor(location_info['input_size'], letterbox=location_info['letterbox'])
+            for location_key, location_info in self.locations.items()
+        }
         
-        # Load YOLO model
-        print("Loading YOLO model...")
+        # Inference backends keyed by (model, input size), created on first use
+        self.backends = {}
+        self.backends_lock = threading.Lock()
         
-        if model_type == 'yolov4-tiny':
-            self.net = cv2.dnn.readNet("yolov4-tiny.weights", "yolov4-tiny.cfg")
-        else:
-            self.net = cv2.dnn.readNet("yolov4.weights", "yolov4.cfg")
+        # Sinks and model load in parallel
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix='startup') as executor:
+            phases = [
+                executor.submit(self.timed, 'firebase', self.init_firebase),
+                executor.submit(self.timed, 'csv', self.init_csv),
+                executor.submit(self.timed, 'sqlite', self.init_store),
+                executor.submit(self.timed, 'model', self.init_model, model_type)
+            ]
+            for phase in phases:
+                phase.result()
+        
+        self.init_sinks()
+        
+        self.startup_timings['init'] = time.time() - self.start_time
+    
+    def timed(self, phase, func, *args):
+        """Run one startup phase and record how long it took"""
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            self.startup_timings[phase] = time.time() - start
+    
+    def init_model(self, model_type):
+        """Download model files if needed, load class names and start the default inference backend"""
+        self.download_model_files()
         
         # Load class names
         with open("coco.names", "r") as f:
@@ -65,30 +177,96 @@ class MultiStreamDetector:
         
         print(f"   Loaded {len(self.classes)} object classes")
         
-        # Get output layer names
-        layer_names = self.net.getLayerNames()
-        self.output_layers = [layer_names[i - 1] for i in self.net.getUnconnectedOutLayers()]
-        
-        print(f"   Network has {len(layer_names)} layers, {len(self.output_layers)} output layers")
+        # Class id -> vehicle/person category lookup for counting
+        self.categories = ClassCategories(self.classes, self.vehicle_classes, self.person_class)
         
         # Define colors for different classes
         self.colors = np.random.uniform(0, 255, size=(len(self.classes), 3))
         
-        # Classes we're interested in
-        self.vehicle_classes = ['car', 'motorcycle', 'bus', 'truck', 'bicycle']
-        self.person_class = 'person'
+        self.inference = self.get_backend(model_type, self.input_size)
         
-        # Detection thresholds
-        self.confidence_threshold = 0.4
-        self.nms_threshold = 0.4
+        print("✅ Model loaded successfully!")
+    
+    def get_backend(self, model_type, input_size):
+        """Return the inference backend for a model and input size, starting it on first use"""
+        key = (model_type, tuple(input_size))
+        
+        with self.backends_lock:
+            if key not in self.backends:
+                self.backends[key] = self.create_backend(model_type, tuple(input_size))
+            return self.backends[key]
+    
+    def create_backend(self, model_type, input_size):
+        """Start a batched scheduler or a worker process pool for one model/input size"""
+        if self.inference_mode == 'process':
+            # Each worker process loads its own copy of the net
+            backend = InferenceWorkerPool(
+                model_type,
+                num_workers=self.num_workers,
+                input_size=input_size,
+                confidence_threshold=self.confidence_threshold,
+                nms_threshold=self.nms_threshold
+            )
+        else:
+            net, output_layers = self.load_net(model_type)
+            
+            # Batched inference: the scheduler thread is the only one touching this net and batch buffer
+            width, height = input_size
+            batch_blob = np.empty((self.max_batch_size, 3, height, width), dtype=np.float32)
+            backend = InferenceScheduler(
+                partial(self.detect_batch, net=net, output_layers=output_layers, input_size=input_size,
+                        batch_blob=batch_blob),
+                max_batch_size=self.max_batch_size,
+                max_wait=self.max_batch_wait
+            )
+        
+        backend.start()
+        return backend
+    
+    def print_startup_report(self):
+        """Print how long each startup phase took"""
+        print("⏱️ Startup timings:")
+        for phase, seconds in self.startup_timings.items():
+            print(f"   {phase:<40} {seconds:6.2f}s")
+    
+    def load_net(self, model_type):
+        """Load YOLO network and resolve its output layers"""
+        print(f"Loading YOLO model ({model_type})...")
         
-        # Thread safety
-        self.lock = threading.Lock()
+        if model_type == 'yolov4-tiny':
+            net = cv2.dnn.readNet("yolov4-tiny.weights", "yolov4-tiny.cfg")
+        else:
+            net = cv2.dnn.readNet("yolov4.weights", "yolov4.cfg")
         
-        print("✅ Model loaded successfully!")
+        # Get output layer names
+        layer_names = net.getLayerNames()
+        output_layers = [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
+        
+        print(f"   Network has {len(layer_names)} layers, {len(output_layers)} output layers")
+        
+        return net, output_layers
     
     def init_firebase(self):
-        """Initialize Firebase connection"""
+        """
+        Connect to Firebase and start the background batch writer
+        Records that can't be delivered are spooled to disk and replayed once Firebase is
+        reachable again; without a connection at startup the writer keeps retrying
+        """
+        self.db_ref = self.connect_firebase()
+        
+        self.spool = Spool(self.spool_dir)
+        if self.spool.segments():
+            print(f"📼 {len(self.spool.segments())} spooled segments from a previous run will be replayed")
+        
+        # Detection threads only enqueue; one thread flushes all locations together
+        self.firebase_writer = FirebaseBatchWriter(self.db_ref, spool=self.spool, reconnect=self.connect_firebase)
+        self.firebase_writer.start()
+        
+        self.spool_replayer = SpoolReplayer(self.spool, self.firebase_writer.replay, ready=self.firebase_writer.is_online)
+        self.spool_replayer.start()
+    
+    def connect_firebase(self):
+        """Initialize the Firebase app and verify it with a test write; returns the root reference or None"""
         try:
             service_account_file = 'firebase-credentials.json'
             
@@ -112,34 +290,58 @@ class MultiStreamDetector:
                             'databaseURL': 'https://citysense-crono-default-rtdb.firebaseio.com'
                         })
             
-            self.db_ref = db.reference('/')
+            db_ref = db.reference('/')
             
             # Test write
             try:
-                test_ref = self.db_ref.child('_test')
+                test_ref = db_ref.child('_test')
                 test_ref.set({'test': 'connection', 'timestamp': datetime.now().isoformat()})
                 test_ref.delete()
                 print("✅ Firebase initialized and verified!")
                 print("📊 Database URL: https://citysense-crono-default-rtdb.firebaseio.com")
+                return db_ref
             except Exception as test_error:
                 print(f"⚠️ Firebase connected but write test failed: {test_error}")
-                self.db_ref = None
+                return None
             
         except Exception as e:
             print(f"⚠️ Firebase initialization error: {e}")
-            self.db_ref = None
+            return None
     
     def init_csv(self):
-        """Initialize CSV file with headers"""
-        with open(self.csv_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'timestamp', 'location', 
-                'vehicle_count', 'person_count', 'total_objects',
-                'cars', 'motorcycles', 'buses', 'trucks', 'bicycles',
-                'traffic_level', 'pedestrian_level'
-            ])
-        print(f"✅ CSV file initialized: {self.csv_file}")
+        """Set up the CSV files; existing files with matching headers are appended to"""
+        self.csv_sink = CSVSink(self.csv_file, [
+            'timestamp', 'location', 
+            'vehicle_count', 'person_count', 'total_objects',
+            'cars', 'motorcycles', 'buses', 'trucks', 'bicycles',
+            'traffic_level', 'pedestrian_level'
+        ])
+        self.rollup_csv_sink = CSVSink(self.rollup_csv_file, [
+            'granularity', 'bucket', 'location', 'samples',
+            'vehicle_mean', 'vehicle_max', 'vehicle_p95',
+            'person_mean', 'person_max', 'person_p95',
+            'cars', 'motorcycles', 'buses', 'trucks', 'bicycles',
+            'traffic_level'
+        ], rotate_daily=False)
+        self.rollup_csv_sink.start()
+        print(f"✅ CSV files ready: {self.csv_file}, {self.rollup_csv_file}")
+    
+    def init_store(self):
+        """Open the SQLite detection history"""
+        self.store = DetectionStore(self.db_file)
+        print(f"✅ Detection store ready: {self.db_file}")
+    
+    def init_sinks(self):
+        """Start one worker per sink; each stream's 'sinks' setting picks which ones get its records"""
+        self.sinks = SinkFanout()
+        self.sinks.add(CSVRecordSink(self.csv_sink), **self.sink_settings['csv'])
+        self.sinks.add(FirebaseSink(self.firebase_writer, self.publish_policies), **self.sink_settings['firebase'])
+        self.sinks.add(SQLiteSink(self.store), **self.sink_settings['sqlite'])
+        self.sinks.add(StdoutSink(), **self.sink_settings['stdout'])
+        self.sinks.add(RollupSink(self.aggregator), **self.sink_settings['rollups'])
+        if self.live_api is not None:
+            self.sinks.add(HTTPSink(self.live_api), **self.sink_settings['http'])
+        self.sinks.start()
     
     def download_model_files(self):
         """Download YOLO model files if not present"""
@@ -158,101 +360,49 @@ class MultiStreamDetector:
                 except Exception as e:
                     print(f"❌ Error downloading {filename}: {e}")
     
-    def get_youtube_stream(self, youtube_url):
-        """Extract stream URL from YouTube"""
-        try:
-            ydl_opts = {
-                'format': 'best[height<=480]/best',
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'socket_timeout': 30,
-                'retries': 10,
-                'fragment_retries': 10,
-                'skip_unavailable_fragments': True,
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                }
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=False)
-                
-                if 'url' in info:
-                    return info['url']
-                elif 'formats' in info:
-                    formats = [f for f in info['formats'] if f.get('url')]
-                    if formats:
-                        return formats[-1]['url']
-                
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error getting stream: {e}")
-            return None
+    def get_youtube_stream(self, youtube_url, force=False):
+        """Get stream URL for a YouTube page (cached until shortly before it expires)"""
+        return self.url_cache.get(youtube_url, 'video', force=force)
     
-    def detect_objects(self, frame):
-        """Detect objects in frame using YOLO"""
-        height, width, channels = frame.shape
-        
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), (0, 0, 0), True, crop=False)
+    def detect_objects(self, frame, location_key):
+        """Detect objects in a stream's frame using YOLO (batched scheduler or worker pool)"""
+        location = self.locations[location_key]
+        preprocessor = self.preprocessors[location_key]
+        
+        # Backends see only the stream's blob and answer in network coordinates
+        detections = self.get_backend(location['model'], location['input_size']).submit(preprocessor(frame))
+        return preprocessor.to_source(detections)
+    
+    def detect_batch(self, blobs, net, output_layers, input_size, batch_blob):
+        """Run one forward pass over preprocessed blobs from several streams"""
+        if len(blobs) == 1:
+            blob = blobs[0]
+        else:
+            blob = np.concatenate(blobs, out=batch_blob[:len(blobs)])
         
-        with self.lock:
-            self.net.setInput(blob)
-            outs = self.net.forward(self.output_layers)
+        net.setInput(blob)
+        outs = net.forward(output_layers)
         
-        class_ids = []
-        confidences = []
-        boxes = []
+        width, height = input_size
+        results = []
         
-        for out in outs:
-            for detection in out:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                
-                if confidence > self.confidence_threshold:
-                    center_x = int(detection[0] * width)
-                    center_y = int(detection[1] * height)
-                    w = int(detection[2] * width)
-                    h = int(detection[3] * height)
-                    
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-                    
-                    boxes.append([x, y, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-        
-        indexes = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence_threshold, self.nms_threshold)
-        
-        return boxes, confidences, class_ids, indexes
-    
-    def count_objects(self, class_ids, indexes):
-        """Count vehicles and people"""
-        vehicle_count = 0
-        person_count = 0
-        vehicle_types = defaultdict(int)
-        
-        if len(indexes) > 0:
-            for i in indexes.flatten():
-                if i < 0 or i >= len(class_ids):
-                    continue
-                
-                class_id = class_ids[i]
-                
-                if class_id < 0 or class_id >= len(self.classes):
-                    continue
-                
-                class_name = self.classes[class_id]
-                
-                if class_name in self.vehicle_classes:
-                    vehicle_count += 1
-                    vehicle_types[class_name] += 1
-                elif class_name == self.person_class:
-                    person_count += 1
+        for i in range(len(blobs)):
+            # Region layers return either (N, rows, 85) or (N*rows, 85) depending on the OpenCV build
+            frame_outs = [
+                out[i] if out.ndim == 3 else out.reshape(len(blobs), -1, out.shape[-1])[i]
+                for out in outs
+            ]
+            
+            boxes, confidences, class_ids = decode_yolo_outputs(frame_outs, width, height, self.confidence_threshold)
+            indexes = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence_threshold, self.nms_threshold)
+            
+            results.append(FrameDetections.from_nms(boxes, confidences, class_ids, indexes))
         
-        return vehicle_count, person_count, vehicle_types
+        return results
+    
+    def count_objects(self, detections):
+        """Count vehicles and people (one bincount over the frame's class ids)"""
+        return self.categories.count(detections)
     
     def get_traffic_level(self, vehicle_count):
         """Determine traffic level"""
@@ -280,159 +430,382 @@ class MultiStreamDetector:
         else:
             return "CROWDED"
     
-    def write_to_csv(self, location, vehicle_count, person_count, vehicle_types):
-        """Write detection data to CSV"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        total_objects = vehicle_count + person_count
-        traffic_level = self.get_traffic_level(vehicle_count)
-        pedestrian_level = self.get_pedestrian_level(person_count)
-        
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                timestamp,
-                location,
-                vehicle_count,
-                person_count,
-                total_objects,
-                vehicle_types.get('car', 0),
-                vehicle_types.get('motorcycle', 0),
-                vehicle_types.get('bus', 0),
-                vehicle_types.get('truck', 0),
-                vehicle_types.get('bicycle', 0),
-                traffic_level,
-                pedestrian_level
+    def write_rollup(self, location_key, granularity, bucket_key, summary):
+        """Write one closed rollup bucket to the location's sinks"""
+        location = self.locations[location_key]
+        location_name = location['name']
+        
+        if 'csv' in location['sinks']:
+            breakdown = summary['vehicle_breakdown']
+            self.rollup_csv_sink.write([
+                granularity,
+                bucket_key,
+                location_name,
+                summary['samples'],
+                summary['cars']['mean'],
+                summary['cars']['max'],
+                summary['cars']['p95'],
+                summary['people']['mean'],
+                summary['people']['max'],
+                summary['people']['p95'],
+                breakdown['cars'],
+                breakdown['motorcycles'],
+                breakdown['buses'],
+                breakdown['trucks'],
+                breakdown['bicycles'],
+                summary['traffic_level']
             ])
-    
-    def write_to_firebase(self, location_key, location_name, vehicle_count, person_count, vehicle_types):
-        """Write detection data to Firebase"""
-        if self.db_ref is None:
-            return False
         
-        try:
-            timestamp = datetime.now().isoformat()
-            timestamp_key = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
-            data = {
-                'cars': vehicle_count,
-                'people': person_count,
-                'timestamp': timestamp,
-                'traffic_level': self.get_traffic_level(vehicle_count),
-                'pedestrian_level': self.get_pedestrian_level(person_count),
-                'vehicle_breakdown': {
-                    'cars': vehicle_types.get('car', 0),
-                    'motorcycles': vehicle_types.get('motorcycle', 0),
-                    'buses': vehicle_types.get('bus', 0),
-                    'trucks': vehicle_types.get('truck', 0),
-                    'bicycles': vehicle_types.get('bicycle', 0)
-                }
-            }
-            
-            # Write to Firebase using the location name (e.g., "Canmore Alberta")
-            location_ref = self.db_ref.child('locations').child(location_name).child('detections')
-            location_ref.child(timestamp_key).set(data)
-            
-            # Update latest data
-            latest_ref = self.db_ref.child('locations').child(location_name).child('latest')
-            latest_ref.set(data)
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Firebase write error for {location_name}: {e}")
-            return False
+        if 'firebase' in location['sinks'] and self.firebase_writer is not None:
+            # Compact node next to the raw detections: locations/<name>/rollups/<granularity>/<bucket>
+            self.firebase_writer.write(location_name, bucket_key, summary, node=f"rollups/{granularity}")
     
-    def process_stream(self, location_key, location_name, stream_url):
-        """Process a single stream in a thread"""
-        print(f"🎬 [{location_name}] Connecting to stream...")
+    def open_capture(self, location_key, stream_url):
+        """Open a stream with the location's ingest backend"""
+        location = self.locations[location_key]
+        
+        if location['ingest'] == 'ffmpeg':
+            if FFmpegPipeCapture.is_available():
+                # ffmpeg decimates and scales to the network input size before handing frames over
+                return FFmpegPipeCapture(
+                    stream_url,
+                    width=location['input_size'][0],
+                    height=location['input_size'][1],
+                    fps=1.0 / location['sample_interval'],
+                    keyframes_only=location['keyframes_only']
+                )
+            print(f"⚠️ [{location['name']}] ffmpeg not found, falling back to OpenCV capture")
         
         cap = cv2.VideoCapture(stream_url, cv2.CAP_FFMPEG)
         cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+    
+    def frames_per_sample(self, location_key, cap):
+        """How many frames the reader advances between analyzed frames"""
+        # The ffmpeg pipe already delivers decimated frames
+        if isinstance(cap, FFmpegPipeCapture):
+            return 1
+        
+        location = self.locations[location_key]
+        if location['sample_every']:
+            return location['sample_every']
+        
+        return max(1, round(self.capture_fps(cap) * location['sample_interval']))
+    
+    def capture_fps(self, cap):
+        """Frame rate the capture delivers (30 when the stream doesn't report a sane one)"""
+        if isinstance(cap, FFmpegPipeCapture):
+            return cap.fps or 30
+        
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if not fps or fps > 120:
+            fps = 30
+        return fps
+    
+    def analyze_frame(self, location_key, location_name, frame, captured_at):
+        """Detect, count and write one frame's results to the location's sinks"""
+        current_time = time.time()
+        location = self.locations[location_key]
+        stats = self.stream_stats[location_name]
+        
+        # Detect objects
+        detections = self.detect_objects(frame, location_key)
+        vehicle_count, person_count, vehicle_types = self.count_objects(detections)
+        
+        # Hand the record to the stream's sinks; each writes on its own thread
+        traffic_level = self.get_traffic_level(vehicle_count)
+        record = DetectionRecord.create(location_key, location_name, vehicle_count, person_count, vehicle_types,
+                                        traffic_level, self.get_pedestrian_level(person_count))
+        
+        # Every sample feeds the rollups, including ones the Firebase publish policy suppresses
+        self.sinks.publish(record, location['sinks'] + ['rollups'])
+        
+        # Log stats
+        elapsed = current_time - stats['last_process_time']
+        fps = (stats['grabbed'] - stats['last_grabbed']) / elapsed if elapsed > 0 else 0
+        frame_age = current_time - captured_at
+        
+        print(f"📍 [{location_name}] 🚗 Cars:{vehicle_count} | 👥 People:{person_count} | 🚦 {traffic_level} | ⚡ {fps:.1f}fps"
+              f" | 🎞️ {stats['decoded']}/{stats['grabbed']} decoded | ⏱️ {frame_age:.2f}s old | 🗑️ {stats['stale_dropped']} stale")
+        
+        stats['last_process_time'] = current_time
+        stats['last_grabbed'] = stats['grabbed']
+        
+        if f"first detection [{location_name}]" not in self.startup_timings:
+            time_to_first = current_time - self.start_time
+            self.startup_timings[f"first detection [{location_name}]"] = time_to_first
+            print(f"⏱️ [{location_name}] First detection {time_to_first:.1f}s after launch")
+    
+    def init_stream_stats(self, location_name):
+        """Create the frame counters for a stream"""
+        return self.stream_stats.setdefault(location_name, {
+            'grabbed': 0,
+            'decoded': 0,
+            'stale_dropped': 0,
+            'last_process_time': time.time(),
+            'last_grabbed': 0
+        })
+    
+    # ---------------------- THREADS MODE (reader + analyzer per stream) ----------------------
+    
+    def read_stream(self, location_key, location_name, stream_url, slot):
+        """Reader thread: keep pulling frames and publish the newest sampled one to the slot"""
+        print(f"🎬 [{location_name}] Connecting to stream...")
+        
+        cap = self.open_capture(location_key, stream_url)
         
         if not cap.isOpened():
             print(f"❌ [{location_name}] Failed to open stream")
+            slot.close()
             return
         
         print(f"✅ [{location_name}] Connected!")
         
         frame_count = 0
-        process_every_n_frames = 30  # Process every 30 frames (~1 second)
-        last_process_time = time.time()
-        
-        while True:
-            ret, frame = cap.read()
+        process_every_n_frames = self.frames_per_sample(location_key, cap)
+        
+        stats = self.stream_stats[location_name]
+        page_url = self.locations[location_key]['url']
+        last_url_check = time.time()
+        
+        while not self.stopping.is_set():
+            # Switch to a refreshed URL before the current one expires, opening the new
+            # capture first so there is no gap
+            if time.time() - last_url_check > self.url_check_interval:
+                last_url_check = time.time()
+                fresh_url = self.url_cache.peek(page_url)
+                if fresh_url and fresh_url != stream_url:
+                    new_cap = self.open_capture(location_key, fresh_url)
+                    if new_cap.isOpened():
+                        cap.release()
+                        cap = new_cap
+                        stream_url = fresh_url
+                        print(f"🔄 [{location_name}] Switched to refreshed stream URL")
+                    else:
+                        new_cap.release()
+            
+            # grab() only advances the stream; skipped frames never get converted to BGR
+            ret = cap.grab()
             
             if not ret:
+                if self.stopping.is_set():
+                    break
                 print(f"⚠️ [{location_name}] Connection lost, reconnecting...")
                 cap.release()
-                time.sleep(5)
                 
-                # Reconnect
-                new_stream_url = self.get_youtube_stream(self.locations[location_key]['url'])
+                # Reconnect, reusing a refreshed URL from the cache when there is one
+                new_stream_url = self.url_cache.peek(page_url)
+                if not new_stream_url or new_stream_url == stream_url:
+                    if self.stopping.wait(5):
+                        slot.close()
+                        return
+                    new_stream_url = self.get_youtube_stream(page_url, force=True)
+                
                 if new_stream_url:
-                    cap = cv2.VideoCapture(new_stream_url, cv2.CAP_FFMPEG)
-                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                    cap = self.open_capture(location_key, new_stream_url)
                     if cap.isOpened():
                         print(f"✅ [{location_name}] Reconnected!")
+                        stream_url = new_stream_url
+                        process_every_n_frames = self.frames_per_sample(location_key, cap)
                         continue
                 
                 print(f"❌ [{location_name}] Failed to reconnect, exiting thread")
                 break
             
             frame_count += 1
+            stats['grabbed'] += 1
             
-            # Process frame periodically
-            if frame_count % process_every_n_frames == 0:
-                current_time = time.time()
-                
-                try:
-                    # Resize for processing
-                    frame = cv2.resize(frame, (640, 480))
-                    
-                    # Detect objects
-                    boxes, confidences, class_ids, indexes = self.detect_objects(frame)
-                    vehicle_count, person_count, vehicle_types = self.count_objects(class_ids, indexes)
-                    
-                    # Write to CSV and Firebase
-                    self.write_to_csv(location_name, vehicle_count, person_count, vehicle_types)
-                    self.write_to_firebase(location_key, location_name, vehicle_count, person_count, vehicle_types)
-                    
-                    # Log stats
-                    elapsed = current_time - last_process_time
-                    fps = process_every_n_frames / elapsed if elapsed > 0 else 0
-                    
-                    traffic_level = self.get_traffic_level(vehicle_count)
-                    print(f"📍 [{location_name}] 🚗 Cars:{vehicle_count} | 👥 People:{person_count} | 🚦 {traffic_level} | ⚡ {fps:.1f}fps")
-                    
-                    last_process_time = current_time
-                    
-                except Exception as e:
-                    print(f"⚠️ [{location_name}] Detection error: {e}")
-                    continue
+            if frame_count % process_every_n_frames != 0:
+                continue
+            
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            stats['decoded'] += 1
+            
+            # Overwrites any frame the analyzer hasn't picked up yet
+            slot.publish(frame)
         
         cap.release()
+        slot.close()
+    
+    def process_stream(self, location_key, location_name, stream_url):
+        """Process a single stream: a reader thread feeds the newest frame, this thread analyzes it"""
+        stats = self.init_stream_stats(location_name)
+        
+        slot = LatestFrameSlot()
+        reader = threading.Thread(
+            target=self.read_stream,
+            args=(location_key, location_name, stream_url, slot),
+            daemon=True
+        )
+        reader.start()
+        
+        while not self.stopping.is_set():
+            item = slot.get(timeout=1.0)
+            
+            if item is None:
+                if slot.closed:
+                    break
+                continue
+            
+            seq, frame, captured_at = item
+            stats['stale_dropped'] = slot.stale_dropped
+            
+            try:
+                self.analyze_frame(location_key, location_name, frame, captured_at)
+            except Exception as e:
+                print(f"⚠️ [{location_name}] Detection error: {e}")
+                continue
+        
+        # A reader stuck in a network read can't be interrupted; it only ever touches the slot
+        reader.join(timeout=5)
         print(f"🛑 [{location_name}] Stream processing stopped")
     
+    # ---------------------- POOL MODE (fixed workers multiplex all streams) ----------------------
+    
+    def grab_latest(self, cap, stats, state):
+        """
+        Advance to the newest frame without waiting for new data, so a pool worker never
+        sits on one stream's network
+        Returns how many frames were grabbed (0: nothing new yet), or None when the stream failed
+        """
+        now = time.time()
+        elapsed = now - state['last_sample'] if state['last_sample'] else 0
+        state['last_sample'] = now
+        
+        if isinstance(cap, FFmpegPipeCapture) and cap.CAN_POLL:
+            # Only read what ffmpeg has already written; the very first frame is worth waiting for
+            grabbed = 0
+            while grabbed < self.max_drain_frames and (not cap.has_frame or cap.frame_ready()):
+                if not cap.grab():
+                    return None
+                grabbed += 1
+                stats['grabbed'] += 1
+            return grabbed
+        
+        # OpenCV (and ffmpeg's pipe on Windows) can't tell whether a frame is buffered: grab about
+        # as many frames as arrived since the last sample, stopping early if one had to wait
+        budget = min(self.max_drain_frames, max(1, int(state['fps'] * elapsed)))
+        for grabbed in range(1, budget + 1):
+            start = time.time()
+            if not cap.grab():
+                return None
+            stats['grabbed'] += 1
+            
+            if time.time() - start > self.live_edge_grab_time:
+                break
+        
+        return grabbed
+    
+    def sample_stream(self, location_key):
+        """
+        Pool worker task: sample the newest frame of one stream and analyze it
+        Returns the number of seconds until the stream is due again
+        """
+        location = self.locations[location_key]
+        location_name = location['name']
+        stats = self.init_stream_stats(location_name)
+        state = self.stream_states.setdefault(location_key, {
+            'cap': None, 'url': None, 'failures': 0, 'url_checked': 0, 'fps': 30, 'last_sample': 0
+        })
+        
+        # Switch to a refreshed URL before the current one expires
+        if state['cap'] is not None and time.time() - state['url_checked'] > self.url_check_interval:
+            state['url_checked'] = time.time()
+            fresh_url = self.url_cache.peek(location['url'])
+            if fresh_url and fresh_url != state['url']:
+                new_cap = self.open_capture(location_key, fresh_url)
+                if new_cap.isOpened():
+                    state['cap'].release()
+                    state['cap'], state['url'] = new_cap, fresh_url
+                    state['fps'], state['last_sample'] = self.capture_fps(new_cap), 0
+                    print(f"🔄 [{location_name}] Switched to refreshed stream URL")
+                else:
+                    new_cap.release()
+        
+        if state['cap'] is None:
+            stream_url = self.get_youtube_stream(location['url'], force=state['failures'] > 0)
+            cap = self.open_capture(location_key, stream_url) if stream_url else None
+            
+            if cap is None or not cap.isOpened():
+                state['failures'] += 1
+                retry = min(60, 5 * state['failures'])
+                print(f"❌ [{location_name}] Failed to open stream, retrying in {retry}s")
+                return retry
+            
+            print(f"✅ [{location_name}] Connected!")
+            state['cap'], state['url'] = cap, stream_url
+            state['url_checked'] = time.time()
+            state['fps'], state['last_sample'] = self.capture_fps(cap), 0
+        
+        cap = state['cap']
+        
+        grabbed = self.grab_latest(cap, stats, state)
+        if grabbed is None:
+            print(f"⚠️ [{location_name}] Connection lost, reconnecting...")
+            cap.release()
+            state['cap'] = None
+            state['failures'] += 1
+            return 5
+        
+        if not grabbed:
+            # No new frame decoded yet; look again shortly instead of blocking this worker
+            return location['sample_interval'] * self.not_ready_retry
+        
+        ret, frame = cap.retrieve()
+        if not ret:
+            return location['sample_interval']
+        
+        stats['decoded'] += 1
+        state['failures'] = 0
+        
+        self.analyze_frame(location_key, location_name, frame, time.time())
+        
+        return location['sample_interval']
+    
+    # ---------------------- RUN ----------------------
+    
     def run_all_streams(self):
         """Run detection on all streams simultaneously"""
+        mode = self.scheduler_settings['mode']
+        
         print("\n" + "=" * 80)
         print("🚀 Starting Multi-Stream Detection")
         print("=" * 80)
         print(f"📍 Monitoring {len(self.locations)} locations simultaneously")
+        if mode == 'pool':
+            print(f"🧵 {self.scheduler_settings['workers']} stream workers (pool mode)")
+        else:
+            print("🧵 One reader + analyzer thread per stream (threads mode)")
         print(f"💾 Writing to: {self.csv_file}")
-        print(f"🔥 Firebase: {'Connected' if self.db_ref else 'Disconnected'}")
+        print(f"🔥 Firebase: {'Connected' if self.db_ref else 'Disconnected (spooling to disk, retrying)'}")
         print("=" * 80 + "\n")
         
         threads = []
+        pool = None
         
-        # Get stream URLs for all locations
-        for location_key, location_info in self.locations.items():
-            location_name = location_info['name']
-            print(f"🔗 Getting stream URL for {location_name}...")
-            stream_url = self.get_youtube_stream(location_info['url'])
+        if mode == 'pool':
+            pool = StreamPool(self.sample_stream, num_workers=self.scheduler_settings['workers'])
+            pool.start()
+        
+        # Start each stream as soon as its URL (resolved concurrently since __init__) is ready
+        location_by_future = {future: location_key for location_key, future in self.url_futures.items()}
+        started = 0
+        
+        for future in as_completed(location_by_future):
+            location_key = location_by_future[future]
+            location_name = self.locations[location_key]['name']
+            stream_url = future.result()
             
             if stream_url:
                 print(f"✅ [{location_name}] Stream URL obtained")
+                started += 1
+                
+                if pool:
+                    pool.schedule(location_key, time.time())
+                    continue
+                
                 # Create and start thread for this location
                 thread = threading.Thread(
                     target=self.process_stream,
@@ -441,12 +814,18 @@ class MultiStreamDetector:
                 )
                 thread.start()
                 threads.append(thread)
-                time.sleep(2)  # Stagger thread starts
             else:
                 print(f"❌ [{location_name}] Failed to get stream URL")
+                if pool:
+                    # The pool keeps retrying with a fresh extraction
+                    pool.schedule(location_key, time.time() + 30)
+        
+        self.url_executor.shutdown(wait=False)
+        self.startup_timings['all streams started'] = time.time() - self.start_time
+        self.print_startup_report()
         
         print("\n" + "=" * 80)
-        print(f"✅ {len(threads)}/{len(self.locations)} streams started successfully")
+        print(f"✅ {started}/{len(self.locations)} streams started successfully")
         print("📊 Data is now being sent to Firebase in real-time")
         print("🔄 Press Ctrl+C to stop all streams")
         print("=" * 80 + "\n")
@@ -457,7 +836,59 @@ class MultiStreamDetector:
                 time.sleep(1)
         except KeyboardInterrupt:
             print("\n\n🛑 Stopping all streams...")
-            print(f"✅ Data saved to {self.csv_file}")
+            
+            # Streams stop first, so no sample is still in flight when backends and sinks go away
+            self.stopping.set()
+            if pool:
+                pool.stop()
+                for state in self.stream_states.values():
+                    if state['cap'] is not None:
+                        state['cap'].release()
+                pool_stats = pool.get_stats()
+                print(f"🧵 Pool: {pool_stats['samples']} samples on {pool_stats['workers']} workers, "
+                      f"avg lag {pool_stats['avg_lag']:.2f}s, {pool_stats['late_samples']} late")
+            deadline = time.time() + 10
+            for thread in threads:
+                thread.join(timeout=max(0.0, deadline - time.time()))
+            
+            for (model, input_size), backend in self.backends.items():
+                stats = backend.get_stats()
+                print(f"🧮 Inference [{model} {input_size[0]}x{input_size[1]}]: {stats['frames']} frames in {stats['batches']} batches "
+                      f"(avg batch {stats['avg_batch_size']:.1f}, {stats['avg_batch_time'] * 1000:.0f}ms/batch)")
+                backend.stop()
+            self.url_cache.stop_refresher()
+            
+            # Sinks drain first; the rollup sink's final buckets go to the rollup CSV and Firebase writer
+            self.sinks.stop()
+            for name, sink_stats in self.sinks.get_stats().items():
+                if sink_stats['submitted']:
+                    print(f"🪣 Sink [{name}]: {sink_stats['written']}/{sink_stats['submitted']} written, "
+                          f"{sink_stats['dropped']} dropped, {sink_stats['errors']} errors, "
+                          f"avg latency {sink_stats['avg_latency'] * 1000:.0f}ms (max {sink_stats['max_latency'] * 1000:.0f}ms), "
+                          f"max queue {sink_stats['max_queue_depth']}")
+            self.rollup_csv_sink.stop()
+            if self.live_api:
+                self.live_api.stop()
+            if self.firebase_writer:
+                self.spool_replayer.stop()
+                self.firebase_writer.stop()
+                self.spool.close()
+                fb_stats = self.firebase_writer.get_stats()
+                print(f"🔥 Firebase: {fb_stats['records_written']} records in {fb_stats['flushes']} flushes "
+                      f"(avg {fb_stats['avg_flush_latency'] * 1000:.0f}ms/flush, max queue {fb_stats['max_queue_depth']}, "
+                      f"{fb_stats['records_dropped']} dropped, {fb_stats['errors']} errors)")
+                spool_stats = self.spool_replayer.get_stats()
+                print(f"📼 Spool: {fb_stats['records_spooled']} records spooled, {spool_stats['records_replayed']} replayed, "
+                      f"{spool_stats['pending_segments']} segments ({spool_stats['pending_bytes']} bytes) left for next run")
+                for location_key, policy in self.publish_policies.items():
+                    policy_stats = policy.get_stats()
+                    print(f"📤 [{self.locations[location_key]['name']}] published {policy_stats['published']}, "
+                          f"suppressed {policy_stats['suppressed']} unchanged samples")
+            self.print_startup_report()
+            for location_name, stats in self.stream_stats.items():
+                print(f"🎞️ [{location_name}] {stats['decoded']} decoded / {stats['grabbed']} grabbed frames, "
+                      f"{stats['stale_dropped']} stale frames dropped")
+            print(f"✅ Data saved to {self.csv_file} and {self.db_file}")
             print("✅ All streams stopped!")
 
 
@@ -469,5 +900,18 @@ if __name__ == "__main__":
     print("📡 Data will be sent to Firebase in real-time")
     print("🚫 No camera input required\n")
     
-    detector = MultiStreamDetector(model_type='yolov4-tiny')
+    parser = argparse.ArgumentParser(description="CitySense multi-stream detector")
+    parser.add_argument('--config', default='locations.json', help="Stream registry (JSON, TOML or YAML)")
+    parser.add_argument('--model', default='yolov4-tiny', choices=['yolov4-tiny', 'yolov4'])
+    parser.add_argument('--inference-mode', choices=['batched', 'process'],
+                        help="Override the registry's scheduler.inference_mode")
+    parser.add_argument('--num-workers', type=int, help="Inference worker processes for 'process' mode")
+    args = parser.parse_args()
+    
+    detector = MultiStreamDetector(
+        model_type=args.model,
+        inference_mode=args.inference_mode,
+        num_workers=args.num_workers,
+        config_file=args.config
+    )
     detector.run_all_streams()
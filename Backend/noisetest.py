@@ -1,15 +1,15 @@
 import yt_dlp
-import requests
-from pydub import AudioSegment
-import io
-import csv
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import time
-from pydub import AudioSegment
-from pydub.utils import which
+from audio_monitor import AudioLevelMonitor
+from csv_sink import CSVSink
+from stream_registry import load_stream_registry
+from stream_url_cache import StreamUrlCache
 
-AudioSegment.converter = which("ffmpeg")
-AudioSegment.ffprobe = which("ffprobe")
+LOG_FILE = "audio_noise_log.csv"
+LOG_HEADER = ['timestamp', 'noise_level_dBFS', 'stream']
 
 # ===============================
 # Function to get audio stream URL
@@ -39,38 +39,203 @@ def get_youtube_audio_stream(youtube_url):
 # ===============================
 # Function to analyze noise level
 # ===============================
-def analyze_audio_noise(audio_url, duration_sec=10):
-    """Fetch short audio chunk and measure loudness (noise level)"""
-    try:
-        response = requests.get(audio_url, stream=True, timeout=10)
-        chunk = b''.join(response.iter_content(1024 * 50))  # ~few seconds of data
-        audio = AudioSegment.from_file(io.BytesIO(chunk), format="webm")
-        loudness = audio.dBFS
-        return loudness
-    except Exception as e:
-        print(f"❌ Error analyzing audio: {e}")
-        return None
+def create_noise_monitor(youtube_url, audio_url, log, duration_sec=10, interval_sec=30, name=None,
+                         refresh_url=None, on_level=None):
+    """
+    Continuous loudness (noise level) from one long-lived ffmpeg decoder
+    Saves the dBFS of the last duration_sec seconds every interval_sec seconds
+    log: started CSVSink the rows are queued on
+    refresh_url: callable returning a fresh audio URL (defaults to a new yt_dlp extraction)
+    on_level: extra callback(level) run after the row is queued
+    """
+    name = name or youtube_url
+
+    def handle_level(level):
+        save_noise_data(log, name, level['dbfs'])
+        if on_level:
+            on_level(level)
+
+    return AudioLevelMonitor(
+        audio_url,
+        name=name,
+        window=duration_sec,
+        publish_interval=interval_sec,
+        on_level=handle_level,
+        refresh_url=refresh_url or (lambda: get_youtube_audio_stream(youtube_url))
+    )
 
 
 # ===============================
 # Function to save result to CSV
 # ===============================
-def save_noise_data(noise_level):
-    """Append noise data to CSV"""
-    filename = "audio_noise_log.csv"
+def save_noise_data(log, stream_name, noise_level):
+    """Queue one noise row; the sink's writer thread batches the file writes"""
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    log.write([now, round(noise_level, 2), stream_name])
+    print(f"📝 [{stream_name}] {now} → {noise_level:.2f} dBFS")
+
+
+# ===============================
+# Multi-stream monitoring
+# ===============================
+def read_url_file(url_file):
+    """One URL per line; blank lines and # comments are skipped"""
+    with open(url_file, 'r') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def load_streams(args):
+    """(name, page_url) pairs from --urls, --url-file and --config; a URL listed twice is monitored once"""
+    streams = []
+    for url in (args.urls or []) + (read_url_file(args.url_file) if args.url_file else []):
+        streams.append((url, url))
+    if args.config:
+        _, locations = load_stream_registry(args.config)
+        streams += [(loc['name'], loc['url']) for loc in locations.values()]
+
+    unique = {}
+    for name, page_url in streams:
+        unique.setdefault(page_url, (name, page_url))
+    return list(unique.values())
+
+
+def print_timing_report(timings, monitors, started_at):
+    """Per-stream resolve time, time to first level and decode rate"""
+    print("⏱️ Stream timings:")
+    print(f"   {'stream':<40} {'resolve':>8} {'first level':>12} {'blocks/s':>9} {'realtime':>9} {'restarts':>9}")
+    for index, timing in timings.items():
+        name = timing['name']
+        monitor = monitors.get(index)
+        resolve = f"{timing['resolve']:.2f}s" if timing.get('resolve') is not None else '-'
+        first_level = f"{timing['first_level']:.2f}s" if timing.get('first_level') is not None else '-'
+        if monitor is None:
+            print(f"   {name[:40]:<40} {resolve:>8} {'failed':>12}")
+            continue
+
+        stats = monitor.get_stats()
+        elapsed = max(time.time() - timing['started'], 1e-6)
+        print(f"   {name[:40]:<40} {resolve:>8} {first_level:>12} {stats['blocks'] / elapsed:>9.1f} "
+              f"{stats['seconds'] / elapsed:>8.2f}x {stats['restarts']:>9}")
+    print(f"   {len(monitors)}/{len(timings)} streams running for {time.time() - started_at:.0f}s")
 
-    with open(filename, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow([now, noise_level])
 
-    print(f"📝 Saved: {now} → {noise_level:.2f} dBFS")
+def monitor_streams(streams, duration_sec=10, interval_sec=30, run_for=None, report_interval=60,
+                    resolve_workers=8, direct=False):
+    """
+    Monitor many audio streams at once from one process
+    URLs are resolved concurrently on a small pool through one shared StreamUrlCache (reused
+    across runs and by the detector); each stream then gets its own AudioLevelMonitor, whose
+    thread only reads ffmpeg's pipe. All rows go through one batched CSVSink.
+    streams: (name, page_url) pairs
+    run_for: seconds to run (None until Ctrl+C)
+    report_interval: seconds between timing reports (0 for the final one only)
+    direct: treat the URLs as playable audio URLs and skip resolution (local files, benchmarks)
+    Dicts are keyed by the stream's index, so streams sharing a display name stay apart
+    """
+    url_cache = None if direct else StreamUrlCache()
+    log = CSVSink(LOG_FILE, LOG_HEADER)
+    log.start()
+
+    started_at = time.time()
+    timings = {index: {'name': name, 'resolve': None, 'first_level': None, 'started': None}
+               for index, (name, _) in enumerate(streams)}
+    monitors = {}
+
+    def resolve(page_url):
+        start = time.time()
+        audio_url = page_url if direct else url_cache.get(page_url, 'audio')
+        return audio_url, time.time() - start
+
+    def record_first_level(index):
+        timing = timings[index]
+        if timing['first_level'] is None:
+            timing['first_level'] = time.time() - timing['started']
+
+    print(f"⏳ Resolving {len(streams)} audio streams...")
+    with ThreadPoolExecutor(max_workers=resolve_workers, thread_name_prefix='resolve') as executor:
+        stream_by_future = {executor.submit(resolve, page_url): (index, name, page_url)
+                            for index, (name, page_url) in enumerate(streams)}
+
+        for future in as_completed(stream_by_future):
+            index, name, page_url = stream_by_future[future]
+            timing = timings[index]
+            audio_url, timing['resolve'] = future.result()
+            if not audio_url:
+                print(f"❌ [{name}] Failed to get audio stream")
+                continue
+
+            monitor = create_noise_monitor(
+                page_url, audio_url, log,
+                duration_sec=duration_sec,
+                interval_sec=interval_sec,
+                name=name,
+                refresh_url=(lambda page_url=page_url: page_url) if direct else
+                            (lambda page_url=page_url: url_cache.get(page_url, 'audio', force=True)),
+                on_level=lambda level, index=index: record_first_level(index)
+            )
+            timing['started'] = time.time()
+            monitor.start()
+            if not monitor.running:
+                # start() already said why (e.g. no ffmpeg)
+                continue
+            monitors[index] = monitor
+            print(f"✅ [{name}] Audio stream ready ({timing['resolve']:.2f}s)")
+
+    print(f"{'✅' if monitors else '❌'} {len(monitors)}/{len(streams)} streams monitored, logging to {LOG_FILE}\n")
+    if not monitors:
+        log.stop()
+        return
+
+    last_report = time.time()
+    try:
+        while run_for is None or time.time() - started_at < run_for:
+            time.sleep(1)
+            if report_interval and time.time() - last_report >= report_interval:
+                last_report = time.time()
+                print_timing_report(timings, monitors, started_at)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped by user.")
+    finally:
+        for monitor in monitors.values():
+            monitor.stop()
+        log.stop()
+        print_timing_report(timings, monitors, started_at)
+        print(f"✅ {log.get_stats()['rows_written']} rows saved to {LOG_FILE}")
 
 
 # ===============================
 # Main Loop
 # ===============================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CitySense audio noise monitor (interactive without arguments)")
+    parser.add_argument('--urls', nargs='+', help="YouTube (or, with --direct, audio) URLs to monitor")
+    parser.add_argument('--url-file', help="File with one URL per line")
+    parser.add_argument('--config', help="Monitor every location of a stream registry (e.g. locations.json)")
+    parser.add_argument('--window', type=float, default=10, help="Seconds of audio each level covers")
+    parser.add_argument('--interval', type=float, default=30, help="Seconds between saved levels")
+    parser.add_argument('--run-for', type=float, help="Stop after this many seconds (default: until Ctrl+C)")
+    parser.add_argument('--report-interval', type=float, default=60, help="Seconds between timing reports")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent URL resolutions")
+    parser.add_argument('--direct', action='store_true', help="URLs are already playable, skip resolution")
+    args = parser.parse_args()
+
+    if args.urls or args.url_file or args.config:
+        streams = load_streams(args)
+        if not streams:
+            print("❌ No streams to monitor.")
+            exit()
+        monitor_streams(
+            streams,
+            duration_sec=args.window,
+            interval_sec=args.interval,
+            run_for=args.run_for,
+            report_interval=args.report_interval,
+            resolve_workers=args.workers,
+            direct=args.direct
+        )
+        exit()
+
     youtube_url = input("🎥 Enter YouTube Live or Video URL: ").strip()
     print("⏳ Extracting audio stream...")
     audio_url = get_youtube_audio_stream(youtube_url)
@@ -82,13 +247,14 @@ if __name__ == "__main__":
     print("✅ Audio stream ready! Starting noise analysis...\n")
 
     # Run continuous monitoring (Ctrl+C to stop)
+    log = CSVSink(LOG_FILE, LOG_HEADER)
+    log.start()
+    monitor = create_noise_monitor(youtube_url, audio_url, log)
+    monitor.start()
     try:
         while True:
-            noise = analyze_audio_noise(audio_url)
-            if noise is not None:
-                save_noise_data(noise)
-            else:
-                print("⚠️ Skipping this round due to error.")
-            time.sleep(30)  # every 30 seconds
+            time.sleep(1)
     except KeyboardInterrupt:
+        monitor.stop()
+        log.stop()
         print("\n🛑 Stopped by user.")
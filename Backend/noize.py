@@ -1,19 +1,22 @@
 import cv2
 import numpy as np
-import yt_dlp
-from collections import defaultdict
 import time
 import urllib.request
 import os
-import csv
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, db
 import threading
 from queue import Queue
-import requests
-import io
-from pydub import AudioSegment
+from frame_detections import FrameDetections, ClassCategories, decode_yolo_outputs
+from frame_preprocessor import FramePreprocessor
+from stream_url_cache import StreamUrlCache
+from audio_monitor import AudioLevelMonitor
+from acoustic_metrics import AcousticMetrics, octave_bands, band_name
+from acoustic_events import AcousticEventDetector
+from csv_sink import CSVSink
+from detection_store import DetectionStore
+from sinks import DetectionRecord, SinkFanout, FunctionSink
 
 
 class MultiStreamDetector:
@@ -52,7 +55,40 @@ class MultiStreamDetector:
             }
         }
 
+        # One cached extraction serves both the video and the audio URL
+        self.url_cache = StreamUrlCache()
+        self.url_cache.start_refresher()
+
+        # Audio runs on its own: one long-lived ffmpeg decoder per location publishes
+        # (level, measured_at) into noise_state every noise_interval seconds, and the video
+        # threads only read the latest entry. A plain dict write/read of a tuple is atomic.
+        self.audio_monitors = {}
+        self.noise_state = {}
+        self.noise_interval = 5.0
+        self.max_noise_age = 60.0
+
+        # Spectral metrics (A-weighted Leq, L10/L50/L90, octave bands) over the last minute
+        self.audio_sample_rate = 16000
+        self.noise_metrics_window = 60.0
+        self.noise_bands = [band_name(centre) for centre in octave_bands(self.audio_sample_rate)]
+
+        # Siren/horn events are logged, sent to Firebase and make that location's video
+        # get analyzed every boosted_process_every frames (instead of process_every) for a while
+        self.events_csv_file = 'acoustic_events.csv'
+        self.process_every = 30
+        self.boosted_process_every = 5
+        self.boost_duration = 60.0
+        self.boost_until = {}
+
         self.init_csv()
+        self.store = DetectionStore('detections.db')
+        self.store.start()
+
+        # Firebase round trips run on their own thread instead of the video loop
+        self.sinks = SinkFanout()
+        self.sinks.add(FunctionSink('firebase', self.write_to_firebase), max_queue=1000, policy='drop', batch_size=1)
+        self.sinks.add(FunctionSink('events', self.write_event_to_firebase), max_queue=1000, policy='drop', batch_size=1)
+        self.sinks.start()
         self.download_model_files()
 
         # Load YOLO model
@@ -71,6 +107,7 @@ class MultiStreamDetector:
         self.colors = np.random.uniform(0, 255, size=(len(self.classes), 3))
         self.vehicle_classes = ['car', 'motorcycle', 'bus', 'truck', 'bicycle']
         self.person_class = 'person'
+        self.categories = ClassCategories(self.classes, self.vehicle_classes, self.person_class)
         self.confidence_threshold = 0.4
         self.nms_threshold = 0.4
         self.lock = threading.Lock()
@@ -99,15 +136,19 @@ class MultiStreamDetector:
             self.db_ref = None
 
     def init_csv(self):
-        with open(self.csv_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'timestamp', 'location',
-                'vehicle_count', 'person_count', 'total_objects',
-                'cars', 'motorcycles', 'buses', 'trucks', 'bicycles',
-                'traffic_level', 'pedestrian_level', 'noise_level_dBFS'
-            ])
-        print(f"✅ CSV initialized: {self.csv_file}")
+        self.csv_sink = CSVSink(self.csv_file, [
+            'timestamp', 'location',
+            'vehicle_count', 'person_count', 'total_objects',
+            'cars', 'motorcycles', 'buses', 'trucks', 'bicycles',
+            'traffic_level', 'pedestrian_level', 'noise_level_dBFS',
+            'noise_level_dBFS_LAeq', 'noise_level_dBFS_L10', 'noise_level_dBFS_L50', 'noise_level_dBFS_L90'
+        ] + [f'noise_level_dBFS_{band}' for band in self.noise_bands] + ['noise_timestamp'])
+        self.csv_sink.start()
+        self.events_csv_sink = CSVSink(self.events_csv_file, [
+            'timestamp', 'location', 'event', 'confidence', 'frequency_hz', 'level_dBFS', 'duration_s'
+        ])
+        self.events_csv_sink.start()
+        print(f"✅ CSV ready: {self.csv_file}, {self.events_csv_file}")
 
     def download_model_files(self):
         files = {
@@ -127,77 +168,69 @@ class MultiStreamDetector:
     # ---------------------- STREAM & DETECTION ----------------------
 
     def get_youtube_stream(self, youtube_url, video=True):
-        """Extract video or audio stream URL"""
-        try:
-            ydl_opts = {
-                'format': 'best[height<=480]/best' if video else 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=False)
-                if 'url' in info:
-                    return info['url']
-                elif 'formats' in info:
-                    formats = [f for f in info['formats'] if f.get('url')]
-                    if formats:
-                        return formats[-1]['url']
-        except Exception as e:
-            print(f"❌ Stream extraction error: {e}")
-        return None
+        """Get video or audio stream URL (cached until shortly before it expires)"""
+        return self.url_cache.get(youtube_url, 'video' if video else 'audio')
 
-    def detect_objects(self, frame):
-        height, width, _ = frame.shape
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), (0, 0, 0), True, crop=False)
+    def detect_objects(self, frame, preprocessor):
+        blob = preprocessor(frame)
         with self.lock:
             self.net.setInput(blob)
             outs = self.net.forward(self.output_layers)
-        class_ids, confidences, boxes = [], [], []
-        for out in outs:
-            for detection in out:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                if confidence > self.confidence_threshold:
-                    center_x, center_y, w, h = (detection[0]*width, detection[1]*height,
-                                                detection[2]*width, detection[3]*height)
-                    x = int(center_x - w/2)
-                    y = int(center_y - h/2)
-                    boxes.append([x, y, int(w), int(h)])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
+        width, height = preprocessor.input_size
+        boxes, confidences, class_ids = decode_yolo_outputs(outs, width, height, self.confidence_threshold)
         indexes = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence_threshold, self.nms_threshold)
-        return boxes, confidences, class_ids, indexes
-
-    def count_objects(self, class_ids, indexes):
-        vehicle_count = 0
-        person_count = 0
-        vehicle_types = defaultdict(int)
-        if len(indexes) > 0:
-            for i in indexes.flatten():
-                if i < 0 or i >= len(class_ids):
-                    continue
-                class_name = self.classes[class_ids[i]]
-                if class_name in self.vehicle_classes:
-                    vehicle_count += 1
-                    vehicle_types[class_name] += 1
-                elif class_name == self.person_class:
-                    person_count += 1
-        return vehicle_count, person_count, vehicle_types
+        return preprocessor.to_source(FrameDetections.from_nms(boxes, confidences, class_ids, indexes))
+
+    def count_objects(self, detections):
+        return self.categories.count(detections)
 
     # ---------------------- AUDIO ANALYSIS ----------------------
 
-    def analyze_audio_noise(self, audio_url):
-        """Fetch small chunk of audio and compute average dBFS"""
-        try:
-            response = requests.get(audio_url, stream=True, timeout=10)
-            data = b''.join(response.iter_content(1024 * 50))
-            audio = AudioSegment.from_file(io.BytesIO(data), format="webm")
-            loudness = audio.dBFS
-            return loudness
-        except Exception as e:
-            print(f"⚠️ Audio analysis failed: {e}")
-            return None
+    def start_audio_monitor(self, loc_key, loc, audio_url):
+        """Decode the location's audio continuously; a sliding 5s dBFS plus spectral metrics land in noise_state"""
+        metrics = AcousticMetrics(sample_rate=self.audio_sample_rate, window=self.noise_metrics_window)
+        detector = AcousticEventDetector(
+            metrics,
+            on_event=lambda event: self.handle_acoustic_event(loc_key, loc['name'], event)
+        )
+        monitor = AudioLevelMonitor(
+            audio_url,
+            name=loc['name'],
+            sample_rate=self.audio_sample_rate,
+            window=5.0,
+            publish_interval=self.noise_interval,
+            analyzer=metrics,
+            event_detector=detector,
+            on_level=lambda level: self.update_noise_state(loc_key, level),
+            refresh_url=lambda: self.url_cache.get(loc['url'], 'audio', force=True)
+        )
+        monitor.start()
+        self.audio_monitors[loc_key] = monitor
+
+    def update_noise_state(self, loc_key, level):
+        """Audio thread: replace the location's noise entry"""
+        self.noise_state[loc_key] = (level, datetime.fromtimestamp(level['timestamp']))
+
+    def get_noise_level(self, loc_key):
+        """(level, measured_at) for the location, or (None, None) if missing or older than max_noise_age"""
+        level, measured_at = self.noise_state.get(loc_key, (None, None))
+        if measured_at is None or (datetime.now() - measured_at).total_seconds() > self.max_noise_age:
+            return None, None
+        return level, measured_at
+
+    def handle_acoustic_event(self, loc_key, loc_name, event):
+        """Audio thread: record a siren/horn and sample the location's video faster for a while"""
+        icon = "🚨" if event.kind == 'siren' else "📯"
+        print(f"{icon} [{loc_name}] {event.kind} at {event.frequency_hz:.0f}Hz, {event.level_dbfs:.1f}dBFS "
+              f"(confidence {event.confidence:.2f})")
+
+        self.events_csv_sink.write([
+            event.timestamp.strftime('%Y-%m-%d %H:%M:%S'), loc_name, event.kind,
+            round(event.confidence, 2), round(event.frequency_hz, 1), round(event.level_dbfs, 1),
+            round(event.duration, 2)
+        ])
+        self.sinks.publish((loc_name, event), ['events'])
+        self.boost_until[loc_key] = time.time() + self.boost_duration
 
     # ---------------------- LEVEL CALCULATION ----------------------
 
@@ -227,46 +260,51 @@ class MultiStreamDetector:
 
     # ---------------------- DATA LOGGING ----------------------
 
-    def write_to_csv(self, loc, v, p, vehicle_types, noise):
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        total = v + p
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                timestamp, loc, v, p, total,
-                vehicle_types.get('car', 0),
-                vehicle_types.get('motorcycle', 0),
-                vehicle_types.get('bus', 0),
-                vehicle_types.get('truck', 0),
-                vehicle_types.get('bicycle', 0),
-                self.get_traffic_level(v),
-                self.get_pedestrian_level(p),
-                noise
-            ])
-
-    def write_to_firebase(self, loc_key, loc_name, v, p, vehicle_types, noise):
+    def write_to_csv(self, record):
+        noise_time = record.noise_timestamp.strftime('%Y-%m-%d %H:%M:%S') if record.noise_timestamp else None
+        metrics = record.noise_metrics
+        if metrics:
+            spectral = [metrics['laeq'], metrics['l10'], metrics['l50'], metrics['l90']]
+            spectral += [metrics['bands'].get(band) for band in self.noise_bands]
+        else:
+            spectral = [None] * (4 + len(self.noise_bands))
+        self.csv_sink.write(record.csv_row() + [record.noise_level] + spectral + [noise_time])
+
+    def write_to_firebase(self, record):
         if self.db_ref is None:
             return
         try:
-            timestamp_key = datetime.now().strftime('%Y%m%d_%H%M%S')
+            timestamp_key = record.timestamp.strftime('%Y%m%d_%H%M%S')
             data = {
-                'cars': v,
-                'people': p,
-                'timestamp': datetime.now().isoformat(),
-                'noise_level_dbfs': noise,
-                'traffic_level': self.get_traffic_level(v),
-                'pedestrian_level': self.get_pedestrian_level(p),
-                'vehicle_breakdown': dict(vehicle_types)
+                'cars': record.vehicle_count,
+                'people': record.person_count,
+                'timestamp': record.timestamp.isoformat(),
+                'traffic_level': record.traffic_level,
+                'pedestrian_level': record.pedestrian_level,
+                'vehicle_breakdown': dict(record.vehicle_types),
+                **record.noise_fields()
             }
-            base = self.db_ref.child('locations').child(loc_name)
+            base = self.db_ref.child('locations').child(record.location_name)
             base.child('detections').child(timestamp_key).set(data)
             base.child('latest').set(data)
         except Exception as e:
             print(f"❌ Firebase write error: {e}")
 
+    def write_event_to_firebase(self, item):
+        if self.db_ref is None:
+            return
+        loc_name, event = item
+        try:
+            data = event.to_dict()
+            base = self.db_ref.child('locations').child(loc_name)
+            base.child('events').child(event.timestamp.strftime('%Y%m%d_%H%M%S_%f')).set(data)
+            base.child('latest_event').set(data)
+        except Exception as e:
+            print(f"❌ Firebase event write error: {e}")
+
     # ---------------------- PROCESSING ----------------------
 
-    def process_stream(self, loc_key, loc_name, video_url, audio_url):
+    def process_stream(self, loc_key, loc_name, video_url):
         print(f"🎬 [{loc_name}] Starting stream...")
         cap = cv2.VideoCapture(video_url, cv2.CAP_FFMPEG)
         if not cap.isOpened():
@@ -274,9 +312,7 @@ class MultiStreamDetector:
             return
 
         frame_count = 0
-        process_every = 30
-        last_noise_time = 0
-        current_noise = None
+        preprocessor = FramePreprocessor((416, 416))
 
         while True:
             ret, frame = cap.read()
@@ -286,21 +322,32 @@ class MultiStreamDetector:
                 break
 
             frame_count += 1
+
+            # Sample faster for a while after a siren/horn on this location's audio
+            boosted = time.time() < self.boost_until.get(loc_key, 0)
+            process_every = self.boosted_process_every if boosted else self.process_every
             if frame_count % process_every == 0:
                 try:
-                    frame = cv2.resize(frame, (640, 480))
-                    boxes, conf, ids, idxs = self.detect_objects(frame)
-                    v, p, types = self.count_objects(ids, idxs)
-
-                    # Update audio every 20 sec
-                    if time.time() - last_noise_time > 20:
-                        current_noise = self.analyze_audio_noise(audio_url)
-                        last_noise_time = time.time()
-
-                    self.write_to_csv(loc_name, v, p, types, current_noise)
-                    self.write_to_firebase(loc_key, loc_name, v, p, types, current_noise)
-
-                    print(f"📍 [{loc_name}] 🚗{v} 👥{p} 🔊{current_noise:.1f}dBFS")
+                    detections = self.detect_objects(frame, preprocessor)
+                    v, p, types = self.count_objects(detections)
+
+                    # Latest audio measurement; never waits on the audio thread
+                    level, noise_time = self.get_noise_level(loc_key)
+                    current_noise = level['dbfs'] if level else None
+
+                    record = DetectionRecord.create(loc_key, loc_name, v, p, types, self.get_traffic_level(v),
+                                                    self.get_pedestrian_level(p), noise_level=current_noise,
+                                                    noise_timestamp=noise_time,
+                                                    noise_metrics=level.get('metrics') if level else None)
+                    self.write_to_csv(record)
+                    self.store.write(loc_name, v, p, types, record.traffic_level, record.pedestrian_level,
+                                     noise_level=current_noise, timestamp=record.timestamp)
+                    self.sinks.publish(record, ['firebase'])
+
+                    noise_text = f"{current_noise:.1f}dBFS" if current_noise is not None else "n/a"
+                    if record.noise_metrics:
+                        noise_text += f" (LAeq {record.noise_metrics['laeq']:.1f}, L90 {record.noise_metrics['l90']:.1f})"
+                    print(f"📍 [{loc_name}] 🚗{v} 👥{p} 🔊{noise_text}")
                 except Exception as e:
                     print(f"⚠️ [{loc_name}] Processing error: {e}")
                     continue
@@ -315,8 +362,15 @@ class MultiStreamDetector:
             print(f"🔗 Getting stream for {loc['name']}...")
             vurl = self.get_youtube_stream(loc['url'], video=True)
             aurl = self.get_youtube_stream(loc['url'], video=False)
-            if vurl and aurl:
-                t = threading.Thread(target=self.process_stream, args=(key, loc['name'], vurl, aurl), daemon=True)
+
+            # Audio and video run independently; either can be missing
+            if aurl:
+                self.start_audio_monitor(key, loc, aurl)
+            else:
+                print(f"⚠️ No audio stream for {loc['name']}")
+
+            if vurl:
+                t = threading.Thread(target=self.process_stream, args=(key, loc['name'], vurl), daemon=True)
                 t.start()
                 threads.append(t)
                 time.sleep(2)
@@ -328,6 +382,12 @@ class MultiStreamDetector:
                 time.sleep(1)
         except KeyboardInterrupt:
             print("\n🛑 Stopping all streams...")
+            for monitor in self.audio_monitors.values():
+                monitor.stop()
+            self.sinks.stop()
+            self.csv_sink.stop()
+            self.events_csv_sink.stop()
+            self.store.stop()
 
 
 if __name__ == "__main__":
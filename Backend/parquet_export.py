@@ -0,0 +1,187 @@
+import argparse
+import csv
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from detection_store import COLUMNS, parse_csv_record, format_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet export: pip install pyarrow")
+
+
+def detection_schema():
+    """
+    Typed Parquet schema for detection records
+    Counts are small integers and the level/source columns are dictionary encoded,
+    so the repeated strings are stored once per row group instead of once per row
+    """
+    require_pyarrow()
+    levels = pa.dictionary(pa.int8(), pa.string())
+    return pa.schema([
+        ('timestamp', pa.timestamp('s')),
+        ('location', pa.string()),
+        ('source_type', levels),
+        ('vehicle_count', pa.int16()),
+        ('person_count', pa.int16()),
+        ('total_objects', pa.int16()),
+        ('cars', pa.int16()),
+        ('motorcycles', pa.int16()),
+        ('buses', pa.int16()),
+        ('trucks', pa.int16()),
+        ('bicycles', pa.int16()),
+        ('traffic_level', levels),
+        ('pedestrian_level', levels),
+        ('noise_level_dbfs', pa.float32()),
+        ('day', pa.string())
+    ])
+
+
+def partitioning():
+    """Hive-style location=<name>/day=<YYYY-mm-dd> directories"""
+    require_pyarrow()
+    return ds.partitioning(pa.schema([('location', pa.string()), ('day', pa.string())]), flavor='hive')
+
+
+def rows_to_table(rows):
+    """Build a typed table from COLUMNS tuples (as stored in SQLite / parsed from CSV)"""
+    schema = detection_schema()
+    columns = dict(zip(COLUMNS, zip(*rows))) if rows else {name: () for name in COLUMNS}
+
+    arrays = []
+    for field in schema:
+        if field.name == 'timestamp':
+            values = pc.strptime(pa.array(columns['timestamp'], pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s')
+        elif field.name == 'day':
+            values = pa.array([timestamp[:10] for timestamp in columns['timestamp']], pa.string())
+        elif pa.types.is_dictionary(field.type):
+            values = pa.array(columns[field.name], pa.string()).dictionary_encode().cast(field.type)
+        else:
+            values = pa.array(columns[field.name], field.type)
+        arrays.append(values)
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_partitions(rows, output_dir):
+    """
+    Write detection rows as location/day partitions, one compacted file per partition
+    Every partition the rows touch is rewritten as a whole, so pass complete days
+    """
+    if not rows:
+        return 0
+
+    table = rows_to_table(rows).sort_by([('location', 'ascending'), ('timestamp', 'ascending')])
+    ds.write_dataset(
+        table,
+        output_dir,
+        format='parquet',
+        partitioning=partitioning(),
+        existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        max_rows_per_group=1024 * 1024
+    )
+    return table.num_rows
+
+
+def export_store(db_file='detections.db', output_dir='history', start=None, end=None):
+    """
+    Compact the SQLite detection store into Parquet, one day at a time
+    start/end: optional range of days to (re)export; defaults to everything
+    """
+    require_pyarrow()
+    exported = 0
+
+    with closing(sqlite3.connect(db_file)) as conn:
+        days_sql = 'SELECT DISTINCT substr(timestamp, 1, 10) FROM detections'
+        days = sorted(row[0] for row in conn.execute(days_sql))
+        if start is not None:
+            days = [day for day in days if day >= format_timestamp(start)[:10]]
+        if end is not None:
+            days = [day for day in days if day <= format_timestamp(end)[:10]]
+
+        for day in days:
+            next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM detections WHERE timestamp >= ? AND timestamp < ?",
+                (day, next_day)
+            ).fetchall()
+            exported += write_partitions(rows, output_dir)
+            print(f"📦 {day}: {len(rows)} rows")
+
+    print(f"✅ Exported {exported} rows from {db_file} to {output_dir}")
+    return exported
+
+
+def export_csv(csv_files, output_dir='history'):
+    """Compact detections CSVs (any layout) into Parquet; each file should hold complete days"""
+    require_pyarrow()
+    rows = []
+    for csv_file in csv_files:
+        with open(csv_file, 'r', newline='') as f:
+            rows.extend(parse_csv_record(record) for record in csv.DictReader(f))
+
+    exported = write_partitions(rows, output_dir)
+    print(f"✅ Exported {exported} rows from {len(csv_files)} CSV files to {output_dir}")
+    return exported
+
+
+def read_history(history_dir='history', locations=None, start=None, end=None, columns=None):
+    """
+    Load detection history as a pyarrow Table
+    Location and day filters prune whole partitions before any file is opened;
+    the timestamp filter is pushed down to Parquet row group statistics
+    locations: list of location names (default: all)
+    start/end: datetime, unix seconds or 'YYYY-mm-dd HH:MM:SS'; start inclusive, end exclusive
+    columns: subset of columns to read
+    """
+    require_pyarrow()
+    dataset = ds.dataset(history_dir, format='parquet', partitioning=partitioning())
+
+    condition = None
+    filters = []
+    if locations:
+        filters.append(ds.field('location').isin(list(locations)))
+    if start is not None:
+        start = format_timestamp(start)
+        filters.append(ds.field('day') >= start[:10])
+        filters.append(ds.field('timestamp') >= pa.scalar(datetime.fromisoformat(start), pa.timestamp('s')))
+    if end is not None:
+        end = format_timestamp(end)
+        filters.append(ds.field('day') <= end[:10])
+        filters.append(ds.field('timestamp') < pa.scalar(datetime.fromisoformat(end), pa.timestamp('s')))
+
+    for expression in filters:
+        condition = expression if condition is None else condition & expression
+
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact CitySense detection history into Parquet")
+    parser.add_argument('--out', default='history', help="Output directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    store_parser = commands.add_parser('store', help="Export from the SQLite detection store")
+    store_parser.add_argument('--db', default='detections.db')
+    store_parser.add_argument('--start', help="First day, 'YYYY-mm-dd'")
+    store_parser.add_argument('--end', help="Last day, 'YYYY-mm-dd'")
+
+    csv_parser = commands.add_parser('csv', help="Export detections CSV files")
+    csv_parser.add_argument('csv_files', nargs='+')
+
+    args = parser.parse_args()
+    if args.command == 'store':
+        export_store(args.db, args.out, args.start, args.end)
+    else:
+        export_csv(args.csv_files, args.out)
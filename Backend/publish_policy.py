@@ -0,0 +1,110 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class PublishPolicy:
+    def __init__(self, min_interval=1.0, max_interval=60.0, on_change=True, deadbands=None,
+                 change_fields=('traffic_level', 'pedestrian_level')):
+        """
+        Decides which samples of one location are worth publishing
+        min_interval: never publish more often than this (seconds)
+        max_interval: always publish at least this often, even if nothing changed (heartbeat)
+        on_change: only publish between heartbeats when a metric moved past its deadband
+        deadbands: {metric: threshold}; a numeric metric counts as changed when it moved by
+                   at least the threshold since the last published sample. Nested fields use
+                   dots, e.g. 'vehicle_breakdown.buses'
+        change_fields: categorical fields where any change counts
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.on_change = on_change
+        self.deadbands = deadbands if deadbands is not None else {'cars': 1, 'people': 2}
+        self.change_fields = change_fields
+
+        self.lock = threading.Lock()
+        self.last_data = None
+        self.last_time = 0.0
+        self.last_key = None
+
+        # Stats
+        self.published = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def get_metric(data, metric):
+        value = data
+        for part in metric.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
+    def has_changed(self, data):
+        """Whether data differs meaningfully from the last published sample"""
+        for field in self.change_fields:
+            if data.get(field) != self.last_data.get(field):
+                return True
+
+        for metric, deadband in self.deadbands.items():
+            new = self.get_metric(data, metric)
+            old = self.get_metric(self.last_data, metric)
+            if new is None or old is None:
+                if new != old:
+                    return True
+                continue
+            if abs(new - old) >= deadband:
+                return True
+
+        return False
+
+    def should_publish(self, data, now=None):
+        """Apply the policy to a sample and remember it if it gets published"""
+        now = now if now is not None else time.time()
+
+        with self.lock:
+            if self.last_data is None:
+                publish = True
+            elif now - self.last_time < self.min_interval:
+                publish = False
+            elif now - self.last_time >= self.max_interval:
+                publish = True
+            elif not self.on_change:
+                publish = True
+            else:
+                publish = self.has_changed(data)
+
+            if publish:
+                self.last_data = data
+                self.last_time = now
+                self.published += 1
+            else:
+                self.suppressed += 1
+
+            return publish
+
+    def make_key(self, now=None):
+        """
+        Collision-free, sortable child key (YYYYmmdd_HHMMSS_ffffff)
+        Keeps the YYYYmmdd_HHMMSS prefix the dashboard parses; bumps the microseconds if two
+        samples of this location land on the same instant
+        """
+        now = now or datetime.now()
+        key = now.strftime('%Y%m%d_%H%M%S_%f')
+
+        with self.lock:
+            if self.last_key is not None and key <= self.last_key:
+                # One microsecond after the last key, carrying into the seconds at _999999
+                last = datetime.strptime(self.last_key, '%Y%m%d_%H%M%S_%f')
+                key = (last + timedelta(microseconds=1)).strftime('%Y%m%d_%H%M%S_%f')
+            self.last_key = key
+
+        return key
+
+    def get_stats(self):
+        total = self.published + self.suppressed
+        return {
+            'published': self.published,
+            'suppressed': self.suppressed,
+            'publish_ratio': self.published / total if total else 0
+        }
@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
 import yt_dlp
-from collections import defaultdict
 import time
 import urllib.request
 import os
@@ -9,6 +8,9 @@ import csv
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, db
+from sinks import DetectionRecord, SinkFanout, FunctionSink
+from frame_detections import FrameDetections, ClassCategories
+from frame_preprocessor import FramePreprocessor
 
 class LiveStreamDetector:
     def __init__(self, model_type='yolov4-tiny'):
@@ -46,6 +48,13 @@ class LiveStreamDetector:
         }
         
         self.init_csv()
+        
+        # CSV and Firebase writes run on their own threads so they never stall the video loop
+        self.sinks = SinkFanout()
+        self.sinks.add(FunctionSink('csv', self.write_to_csv), max_queue=1000, policy='drop', batch_size=1)
+        self.sinks.add(FunctionSink('firebase', self.write_to_firebase), max_queue=1000, policy='drop', batch_size=1)
+        self.sinks.start()
+        
         self.download_model_files()
         
         # Load YOLO model
@@ -75,6 +84,12 @@ class LiveStreamDetector:
         self.vehicle_classes = ['car', 'motorcycle', 'bus', 'truck', 'bicycle']
         self.person_class = 'person'
         
+        # Frames go straight from source size to the network blob, reusing its buffers
+        self.preprocessor = FramePreprocessor((416, 416))
+        
+        # Class id -> vehicle/person category lookup for counting
+        self.categories = ClassCategories(self.classes, self.vehicle_classes, self.person_class)
+        
         # Detection thresholds
         self.confidence_threshold = 0.4
         self.nms_threshold = 0.4
@@ -232,9 +247,10 @@ class LiveStreamDetector:
     
     def detect_objects(self, frame):
         """Detect objects in frame using YOLO"""
-        height, width, channels = frame.shape
+        # Boxes are decoded in network coordinates and mapped back to the frame at the end
+        width, height = self.preprocessor.input_size
         
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), (0, 0, 0), True, crop=False)
+        blob = self.preprocessor(frame)
         self.net.setInput(blob)
         outs = self.net.forward(self.output_layers)
         
@@ -263,35 +279,11 @@ class LiveStreamDetector:
         
         indexes = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence_threshold, self.nms_threshold)
         
-        return boxes, confidences, class_ids, indexes
+        return self.preprocessor.to_source(FrameDetections.from_nms(boxes, confidences, class_ids, indexes))
     
-    def count_objects(self, class_ids, indexes):
+    def count_objects(self, detections):
         """Count vehicles and people"""
-        vehicle_count = 0
-        person_count = 0
-        vehicle_types = defaultdict(int)
-        
-        if len(indexes) > 0:
-            for i in indexes.flatten():
-                # Safety check to avoid index out of range
-                if i < 0 or i >= len(class_ids):
-                    continue
-                
-                class_id = class_ids[i]
-                
-                # Make sure class_id is valid
-                if class_id < 0 or class_id >= len(self.classes):
-                    continue
-                
-                class_name = self.classes[class_id]
-                
-                if class_name in self.vehicle_classes:
-                    vehicle_count += 1
-                    vehicle_types[class_name] += 1
-                elif class_name == self.person_class:
-                    person_count += 1
-        
-        return vehicle_count, person_count, vehicle_types
+        return self.categories.count(detections)
     
     def get_traffic_level(self, vehicle_count):
         """Determine traffic level"""
@@ -319,47 +311,46 @@ class LiveStreamDetector:
         else:
             return "CROWDED"
     
-    def write_to_csv(self, source_type, source_id, vehicle_count, person_count, vehicle_types):
-        """Write detection data to CSV"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        total_objects = vehicle_count + person_count
-        traffic_level = self.get_traffic_level(vehicle_count)
-        pedestrian_level = self.get_pedestrian_level(person_count)
-        
+    def write_to_csv(self, record):
+        """Write detection data to CSV (runs on the CSV sink thread)"""
         with open(self.csv_file, 'a', newline='') as f:
             writer = csv.writer(f)
             writer.writerow([
-                timestamp,
-                source_type,
-                source_id,
-                vehicle_count,
-                person_count,
-                total_objects,
-                vehicle_types.get('car', 0),
-                vehicle_types.get('motorcycle', 0),
-                vehicle_types.get('bus', 0),
-                vehicle_types.get('truck', 0),
-                vehicle_types.get('bicycle', 0),
-                traffic_level,
-                pedestrian_level
+                record.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                record.source_type,
+                record.location_key,
+                record.vehicle_count,
+                record.person_count,
+                record.vehicle_count + record.person_count,
+                record.vehicle_types.get('car', 0),
+                record.vehicle_types.get('motorcycle', 0),
+                record.vehicle_types.get('bus', 0),
+                record.vehicle_types.get('truck', 0),
+                record.vehicle_types.get('bicycle', 0),
+                record.traffic_level,
+                record.pedestrian_level
             ])
     
-    def write_to_firebase(self, location_name, vehicle_count, person_count):
-        """Write detection data to Firebase Realtime Database"""
+    def write_to_firebase(self, record):
+        """Write detection data to Firebase Realtime Database (runs on the Firebase sink thread)"""
         if self.db_ref is None:
             return False
         
+        location_name = record.location_name
+        vehicle_count = record.vehicle_count
+        person_count = record.person_count
+        
         try:
-            timestamp = datetime.now().isoformat()
-            timestamp_key = datetime.now().strftime('%Y%m%d_%H%M%S')
+            timestamp = record.timestamp.isoformat()
+            timestamp_key = record.timestamp.strftime('%Y%m%d_%H%M%S')
             
             # Data structure
             data = {
                 'cars': vehicle_count,
                 'people': person_count,
                 'timestamp': timestamp,
-                'traffic_level': self.get_traffic_level(vehicle_count),
-                'pedestrian_level': self.get_pedestrian_level(person_count)
+                'traffic_level': record.traffic_level,
+                'pedestrian_level': record.pedestrian_level
             }
             
             # Write to Firebase: locations/{location_name}/detections/{timestamp}
@@ -378,39 +369,25 @@ class LiveStreamDetector:
             print(f"   Location: {location_name}, Path: locations/{location_name}")
             return False
     
-    def draw_detections(self, frame, boxes, confidences, class_ids, indexes):
+    def draw_detections(self, frame, detections):
         """Draw bounding boxes and labels"""
         font = cv2.FONT_HERSHEY_SIMPLEX
         
-        if len(indexes) > 0:
-            for i in indexes.flatten():
-                # Safety checks
-                if i < 0 or i >= len(boxes) or i >= len(class_ids) or i >= len(confidences):
-                    continue
-                
-                box = boxes[i]
-                x, y, w, h = box
-                
-                class_id = class_ids[i]
-                
-                # Validate class_id
-                if class_id < 0 or class_id >= len(self.classes):
-                    continue
-                
-                label = str(self.classes[class_id])
-                confidence = confidences[i]
-                color = self.colors[class_id]
-                
-                # Make sure coordinates are valid
-                if x < 0 or y < 0 or w <= 0 or h <= 0:
-                    continue
-                
-                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-                
-                label_text = f"{label}: {confidence:.2f}"
-                (text_width, text_height), baseline = cv2.getTextSize(label_text, font, 0.5, 2)
-                cv2.rectangle(frame, (x, y - text_height - 10), (x + text_width, y), color, -1)
-                cv2.putText(frame, label_text, (x, y - 5), font, 0.5, (0, 0, 0), 2)
+        # Rows are NMS survivors only; drop unknown classes and degenerate boxes in one pass
+        rows = detections.array
+        rows = rows[(rows['class_id'] >= 0) & (rows['class_id'] < len(self.classes)) &
+                    (rows['x'] >= 0) & (rows['y'] >= 0) & (rows['w'] > 0) & (rows['h'] > 0)]
+        
+        for x, y, w, h, confidence, class_id in rows.tolist():
+            label = str(self.classes[class_id])
+            color = self.colors[class_id]
+            
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+            
+            label_text = f"{label}: {confidence:.2f}"
+            (text_width, text_height), baseline = cv2.getTextSize(label_text, font, 0.5, 2)
+            cv2.rectangle(frame, (x, y - text_height - 10), (x + text_width, y), color, -1)
+            cv2.putText(frame, label_text, (x, y - 5), font, 0.5, (0, 0, 0), 2)
         
         return frame
     
@@ -506,35 +483,32 @@ class LiveStreamDetector:
                     fps_time = time.time()
                 
                 try:
-                    display_frame = frame.copy()
-                    frame = cv2.resize(frame, (640, 480))
-                    
-                    boxes, confidences, class_ids, indexes = self.detect_objects(frame)
-                    vehicle_count, person_count, vehicle_types = self.count_objects(class_ids, indexes)
+                    detections = self.detect_objects(frame)
+                    vehicle_count, person_count, vehicle_types = self.count_objects(detections)
                 except Exception as e:
                     print(f"⚠️ Detection error: {e}")
                     continue
                 
                 # Write to CSV and Firebase periodically
                 if frame_count % write_every_n_frames == 0:
-                    self.write_to_csv(source_type, str(source_id), vehicle_count, person_count, vehicle_types)
+                    record = DetectionRecord.create(
+                        str(source_id), location_name, vehicle_count, person_count, vehicle_types,
+                        self.get_traffic_level(vehicle_count), self.get_pedestrian_level(person_count),
+                        source_type=source_type
+                    )
                     
                     # Write to Firebase for YouTube streams
                     if source_type == 'youtube' and location_name:
-                        self.write_to_firebase(location_name, vehicle_count, person_count)
-                
-                scale_x = display_frame.shape[1] / frame.shape[1]
-                scale_y = display_frame.shape[0] / frame.shape[0]
-                
-                scaled_boxes = [[int(x*scale_x), int(y*scale_y), int(w*scale_x), int(h*scale_y)] 
-                               for x, y, w, h in boxes]
+                        self.sinks.publish(record, ['csv', 'firebase'])
+                    else:
+                        self.sinks.publish(record, ['csv'])
                 
-                display_frame = self.draw_detections(display_frame, scaled_boxes, confidences, class_ids, indexes)
+                # Detection only read the frame, so draw on it directly (boxes are already in frame coordinates)
+                display_frame = self.draw_detections(frame, detections)
                 
-                # Info panel
-                overlay = display_frame.copy()
-                cv2.rectangle(overlay, (0, 0), (400, 280), (0, 0, 0), -1)
-                cv2.addWeighted(overlay, 0.6, display_frame, 0.4, 0, display_frame)
+                # Info panel: blending with black is just darkening, done in place on the panel area
+                panel = display_frame[0:281, 0:401]
+                cv2.addWeighted(panel, 0.4, panel, 0, 0, panel)
                 
                 traffic_level = self.get_traffic_level(vehicle_count)
                 pedestrian_level = self.get_pedestrian_level(person_count)
@@ -602,6 +576,7 @@ class LiveStreamDetector:
         
         cap.release()
         cv2.destroyAllWindows()
+        self.sinks.stop()
         print(f"\n✅ Detection stopped! Data saved to {self.csv_file}")
 
 
@@ -0,0 +1,417 @@
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from queue import Queue, Empty, Full
+from types import MappingProxyType
+
+from detection_store import INSERT, make_row
+
+
+class DetectionRecord(namedtuple('DetectionRecord', [
+        'location_key', 'location_name', 'timestamp', 'vehicle_count', 'person_count',
+        'vehicle_types', 'traffic_level', 'pedestrian_level', 'noise_level', 'noise_timestamp', 'noise_metrics',
+        'source_type'])):
+    """
+    One analyzed sample; immutable, so every sink thread can share the same instance
+    noise_timestamp is when the noise level was measured, independent of the frame's timestamp
+    noise_metrics is AcousticMetrics.get_metrics() output (A-weighted Leq, L10/L50/L90, octave bands)
+    """
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, location_key, location_name, vehicle_count, person_count, vehicle_types, traffic_level,
+               pedestrian_level, noise_level=None, timestamp=None, source_type='youtube', noise_timestamp=None,
+               noise_metrics=None):
+        return cls(location_key, location_name, timestamp or datetime.now(), vehicle_count, person_count,
+                   MappingProxyType(dict(vehicle_types)), traffic_level, pedestrian_level, noise_level,
+                   noise_timestamp, noise_metrics, source_type)
+
+    def to_dict(self):
+        """Record as stored in Firebase and served by the live API"""
+        data = {
+            'cars': self.vehicle_count,
+            'people': self.person_count,
+            'timestamp': self.timestamp.isoformat(),
+            'traffic_level': self.traffic_level,
+            'pedestrian_level': self.pedestrian_level,
+            'vehicle_breakdown': {
+                'cars': self.vehicle_types.get('car', 0),
+                'motorcycles': self.vehicle_types.get('motorcycle', 0),
+                'buses': self.vehicle_types.get('bus', 0),
+                'trucks': self.vehicle_types.get('truck', 0),
+                'bicycles': self.vehicle_types.get('bicycle', 0)
+            }
+        }
+        if self.noise_level is not None:
+            data.update(self.noise_fields())
+        return data
+
+    def noise_fields(self):
+        """The noise_level_dbfs field family as stored in Firebase"""
+        data = {'noise_level_dbfs': self.noise_level}
+        if self.noise_metrics:
+            data['noise_level_dbfs_laeq'] = self.noise_metrics['laeq']
+            data['noise_level_dbfs_l10'] = self.noise_metrics['l10']
+            data['noise_level_dbfs_l50'] = self.noise_metrics['l50']
+            data['noise_level_dbfs_l90'] = self.noise_metrics['l90']
+            data['noise_level_dbfs_bands'] = dict(self.noise_metrics['bands'])
+        data['noise_timestamp'] = self.noise_timestamp.isoformat() if self.noise_timestamp else None
+        return data
+
+    def csv_row(self):
+        """Row in the detections.csv layout of multi_stream_detector.py"""
+        return [
+            self.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            self.location_name,
+            self.vehicle_count,
+            self.person_count,
+            self.vehicle_count + self.person_count,
+            self.vehicle_types.get('car', 0),
+            self.vehicle_types.get('motorcycle', 0),
+            self.vehicle_types.get('bus', 0),
+            self.vehicle_types.get('truck', 0),
+            self.vehicle_types.get('bicycle', 0),
+            self.traffic_level,
+            self.pedestrian_level
+        ]
+
+    def store_row(self):
+        """Row for the SQLite detection store"""
+        return make_row(self.location_name, self.vehicle_count, self.person_count, self.vehicle_types,
+                        self.traffic_level, self.pedestrian_level, self.noise_level, self.timestamp,
+                        self.source_type)
+
+
+# ---------------------- SINK INTERFACE ----------------------
+
+class Sink:
+    """
+    Destination for detection records
+    Subclasses implement write() or, to batch, write_batch(); open() and close() run on
+    the sink's worker thread before the first and after the last batch
+    """
+    name = 'sink'
+
+    def open(self):
+        pass
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def write_batch(self, records):
+        for record in records:
+            self.write(record)
+
+    def close(self):
+        pass
+
+
+class FunctionSink(Sink):
+    def __init__(self, name, func):
+        """Adapts a plain callable(record) into a sink"""
+        self.name = name
+        self.func = func
+
+    def write(self, record):
+        self.func(record)
+
+
+class SinkWorker:
+    def __init__(self, sink, max_queue=1000, policy='drop', batch_size=100, max_wait=1.0):
+        """
+        Runs one sink on its own thread behind a bounded queue
+        policy: 'drop' discards records while the queue is full (the detector never waits),
+                'block' makes submit() wait for room (backpressure, nothing lost)
+        batch_size: max records handed to write_batch() at once
+        max_wait: max seconds to wait for a batch to fill before writing what is there
+        """
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown sink policy '{policy}' (use 'drop' or 'block')")
+
+        self.sink = sink
+        self.policy = policy
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+        self.queue = Queue(maxsize=max_queue)
+        self.thread = None
+        self.running = False
+        # Set when the sink could not be opened; submit() then drops right away
+        self.failed = False
+        self.stop_timeout = 30
+
+        # Metrics
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.write_time = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.max_queue_depth = 0
+
+    def start(self):
+        """Start the worker thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"sink-{self.sink.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Write everything still queued, close the sink and stop"""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.queue.put(None, timeout=self.stop_timeout)
+        except Full:
+            print(f"⚠️ Sink '{self.sink.name}' did not drain its queue in {self.stop_timeout}s, abandoning it")
+            return
+        self.thread.join(timeout=self.stop_timeout)
+
+    def submit(self, record):
+        """Queue a record according to the worker's policy"""
+        self.submitted += 1
+        if self.failed:
+            self.dropped += 1
+            return False
+
+        item = (time.time(), record)
+
+        if self.policy == 'block':
+            # Wait for room, but not on a worker that has died in the meantime
+            while True:
+                try:
+                    self.queue.put(item, timeout=1.0)
+                    break
+                except Full:
+                    if self.failed:
+                        self.dropped += 1
+                        return False
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except Full:
+                self.dropped += 1
+                return False
+
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def _collect_batch(self):
+        """Wait for one item, then up to batch_size within max_wait; (batch, stopping)"""
+        item = self.queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.time()))
+            except Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _write(self, batch):
+        start = time.time()
+        try:
+            self.sink.write_batch([record for _, record in batch])
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Sink '{self.sink.name}' write error ({len(batch)} records): {e}")
+            return
+
+        finished = time.time()
+        self.batches += 1
+        self.written += len(batch)
+        self.write_time += finished - start
+        for enqueued_at, _ in batch:
+            latency = finished - enqueued_at
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    def _run(self):
+        """Worker loop"""
+        try:
+            self.sink.open()
+        except Exception as e:
+            print(f"❌ Sink '{self.sink.name}' failed to open: {e}, dropping its records")
+            self.fail()
+            return
+
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect_batch()
+            if batch:
+                self._write(batch)
+
+        try:
+            self.sink.close()
+        except Exception as e:
+            print(f"⚠️ Sink '{self.sink.name}' close error: {e}")
+
+    def fail(self):
+        """Stop accepting records and count everything already queued as dropped"""
+        self.failed = True
+        self.running = False
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                self.dropped += 1
+
+    def get_stats(self):
+        """Return sink metrics"""
+        return {
+            'failed': self.failed,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'batches': self.batches,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'avg_batch_time': self.write_time / self.batches if self.batches else 0,
+            'avg_latency': self.total_latency / self.written if self.written else 0,
+            'max_latency': self.max_latency
+        }
+
+
+class SinkFanout:
+    def __init__(self):
+        """Hands each record to the workers of the sinks it is routed to"""
+        self.workers = {}
+
+    def add(self, sink, **settings):
+        """Register a sink; settings are SinkWorker options"""
+        self.workers[sink.name] = SinkWorker(sink, **settings)
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.start()
+
+    def stop(self):
+        """Stop every worker; each drains its own queue first"""
+        for worker in self.workers.values():
+            worker.stop()
+
+    def publish(self, record, sink_names):
+        """Submit record to the named sinks (names without a registered sink are ignored)"""
+        for name in sink_names:
+            worker = self.workers.get(name)
+            if worker is not None:
+                worker.submit(record)
+
+    def get_stats(self):
+        return {name: worker.get_stats() for name, worker in self.workers.items()}
+
+
+# ---------------------- SINKS ----------------------
+
+class CSVRecordSink(Sink):
+    name = 'csv'
+
+    def __init__(self, csv_sink):
+        """Appends records to a CSVSink's file; the worker thread is the only writer"""
+        self.csv_sink = csv_sink
+
+    def open(self):
+        self.csv_sink.open()
+
+    def write_batch(self, records):
+        self.csv_sink.write_rows([record.csv_row() for record in records])
+        self.csv_sink.flush()
+
+    def close(self):
+        self.csv_sink.close()
+
+
+class FirebaseSink(Sink):
+    name = 'firebase'
+
+    def __init__(self, writer, publish_policies):
+        """
+        Applies each location's publish policy and queues what passes on the batch writer
+        (which owns batching across locations, the spool and reconnects)
+        """
+        self.writer = writer
+        self.publish_policies = publish_policies
+
+    def write(self, record):
+        data = record.to_dict()
+        policy = self.publish_policies[record.location_key]
+        if policy.should_publish(data, now=record.timestamp.timestamp()):
+            # Stored under the location name (e.g., "Canmore Alberta") at the writer's next flush
+            self.writer.write(record.location_name, policy.make_key(record.timestamp), data)
+
+
+class SQLiteSink(Sink):
+    name = 'sqlite'
+
+    def __init__(self, store):
+        """Inserts each batch into the detection store in one transaction"""
+        self.store = store
+        self.conn = None
+
+    def open(self):
+        self.conn = self.store.connect()
+
+    def write_batch(self, records):
+        with self.conn:
+            self.conn.executemany(INSERT, [record.store_row() for record in records])
+
+    def close(self):
+        self.conn.close()
+
+
+class HTTPSink(Sink):
+    name = 'http'
+
+    def __init__(self, live_api):
+        """Publishes every record to the local live API"""
+        self.live_api = live_api
+
+    def write(self, record):
+        self.live_api.publish(record.location_name, record.to_dict())
+
+
+class StdoutSink(Sink):
+    name = 'stdout'
+
+    def write_batch(self, records):
+        """One JSON line per record"""
+        print('\n'.join(json.dumps(dict(record.to_dict(), location=record.location_name)) for record in records),
+              flush=True)
+
+
+class RollupSink(Sink):
+    name = 'rollups'
+
+    def __init__(self, aggregator):
+        """Feeds records into the minute/hour/day aggregator; open buckets are flushed on close"""
+        self.aggregator = aggregator
+
+    def open(self):
+        self.aggregator.start()
+
+    def write(self, record):
+        self.aggregator.add(record.location_key, record.vehicle_count, record.person_count, record.vehicle_types,
+                            record.traffic_level, timestamp=record.timestamp.timestamp())
+
+    def close(self):
+        self.aggregator.stop()
+        self.aggregator.flush()
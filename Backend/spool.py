@@ -0,0 +1,209 @@
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+# Record framing: payload length and CRC32 of the payload, then the JSON payload
+RECORD_HEADER = struct.Struct('<II')
+
+
+class Spool:
+    def __init__(self, directory='spool', segment_bytes=8 * 1024 * 1024):
+        """
+        Disk-backed, append-only spool for records a sink couldn't deliver
+        Records go into numbered segment files; each record is length-prefixed and
+        CRC32-checked, so a torn write at the end of a segment (e.g. power loss) is
+        detected and skipped instead of corrupting everything after it
+        directory: where segment files live
+        segment_bytes: start a new segment once the current one reaches this size
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.file = None
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self.segments()
+        self.next_segment = self.segment_number(segments[-1]) + 1 if segments else 0
+
+        # Stats
+        self.records_spooled = 0
+        self.corrupt_records = 0
+
+    @staticmethod
+    def segment_number(path):
+        return int(os.path.basename(path)[4:-4])
+
+    def segments(self):
+        """Segment files, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, 'seg-*.log')), key=self.segment_number)
+
+    def append(self, records):
+        """Durably append a list of JSON-serializable records"""
+        if not records:
+            return
+
+        data = bytearray()
+        for record in records:
+            payload = json.dumps(record, separators=(',', ':')).encode()
+            data += RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+
+        with self.lock:
+            if self.file is None:
+                path = os.path.join(self.directory, f"seg-{self.next_segment:010d}.log")
+                self.next_segment += 1
+                self.file = open(path, 'ab')
+
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.records_spooled += len(records)
+
+            if self.file.tell() >= self.segment_bytes:
+                self.file.close()
+                self.file = None
+
+    def seal(self):
+        """Close the segment being written so it can be replayed"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def sealed_segments(self):
+        """Segments no longer being written, oldest first"""
+        with self.lock:
+            active = self.file.name if self.file is not None else None
+        return [path for path in self.segments() if path != active]
+
+    def read_segment(self, path):
+        """All intact records of a segment; reading stops at the first damaged one"""
+        records = []
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                self.corrupt_records += 1
+                print(f"⚠️ Spool: damaged record in {os.path.basename(path)} at byte {offset}, skipping rest of segment")
+                break
+            records.append(json.loads(payload))
+            offset += RECORD_HEADER.size + length
+
+        return records
+
+    def remove(self, path):
+        os.remove(path)
+
+    def pending_bytes(self):
+        return sum(os.path.getsize(path) for path in self.segments())
+
+    def close(self):
+        self.seal()
+
+
+class SpoolReplayer:
+    def __init__(self, spool, send_batch, ready=None, batch_size=500, max_records_per_second=1000,
+                 retry_interval=10.0):
+        """
+        Drains a Spool back into its sink once the sink is reachable again
+        Segments are replayed oldest first in batch_size chunks and deleted only after
+        every chunk went through; a failed chunk leaves the segment for the next try,
+        so the sink's writes must be idempotent
+        send_batch: callable(records) that raises on failure
+        ready: optional callable() -> bool; replay only starts while it returns True
+        max_records_per_second: throttle so the backlog doesn't starve live writes
+        retry_interval: seconds between checks/retries while idle or failing
+        """
+        self.spool = spool
+        self.send_batch = send_batch
+        self.ready = ready or (lambda: True)
+        self.batch_size = batch_size
+        self.max_records_per_second = max_records_per_second
+        self.retry_interval = retry_interval
+
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Stats
+        self.records_replayed = 0
+        self.segments_replayed = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the replay thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+
+    def replay_segment(self, path):
+        """Send one segment in throttled chunks; True once it is fully delivered and removed"""
+        records = self.spool.read_segment(path)
+
+        for start in range(0, len(records), self.batch_size):
+            if not self.running:
+                return False
+
+            chunk = records[start:start + self.batch_size]
+            began = time.time()
+            try:
+                self.send_batch(chunk)
+            except Exception as e:
+                print(f"⚠️ Spool replay failed, will retry: {e}")
+                self.errors += 1
+                return False
+
+            self.records_replayed += len(chunk)
+            # Pace the replay to max_records_per_second
+            self.stop_event.wait(max(0.0, len(chunk) / self.max_records_per_second - (time.time() - began)))
+
+        self.spool.remove(path)
+        self.segments_replayed += 1
+        return True
+
+    def _run(self):
+        """Replay loop"""
+        while self.running:
+            if self.ready() and self.spool.segments():
+                # Hand the segment being written over too, so a short outage doesn't sit in the spool
+                self.spool.seal()
+                segments = self.spool.sealed_segments()
+                if segments:
+                    print(f"📼 Replaying {len(segments)} spooled segments...")
+                for path in segments:
+                    if not self.replay_segment(path):
+                        break
+                else:
+                    if segments:
+                        print(f"✅ Spool drained ({self.records_replayed} records replayed so far)")
+                        continue
+
+            self.stop_event.wait(self.retry_interval)
+
+    def get_stats(self):
+        """Return replay statistics"""
+        return {
+            'records_replayed': self.records_replayed,
+            'segments_replayed': self.segments_replayed,
+            'pending_segments': len(self.spool.segments()),
+            'pending_bytes': self.spool.pending_bytes(),
+            'errors': self.errors,
+            'corrupt_records': self.spool.corrupt_records
+        }
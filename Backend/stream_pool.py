@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class StreamPool:
+    def __init__(self, sample_stream, num_workers=4):
+        """
+        Fixed pool of worker threads that multiplexes any number of streams on a schedule
+        sample_stream: callable(location_key) that samples one frame from a stream and
+                       returns the number of seconds until that stream is due again
+        num_workers: worker threads, independent of how many streams are registered
+        """
+        self.sample_stream = sample_stream
+        self.num_workers = num_workers
+
+        self.schedule_heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.workers = []
+        self.running = False
+
+        # Stats
+        self.samples = 0
+        self.late_samples = 0
+        self.total_lag = 0.0
+
+    def schedule(self, location_key, due_time):
+        """Queue a stream to be sampled at due_time"""
+        with self.condition:
+            heapq.heappush(self.schedule_heap, (due_time, next(self.counter), location_key))
+            self.condition.notify()
+
+    def start(self):
+        """Start the worker threads"""
+        if self.running:
+            return
+        self.running = True
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._run, name=f"stream-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout=10.0):
+        """Stop the worker threads and wait (up to timeout seconds) for their current sample to finish"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            worker.join(timeout=max(0.0, deadline - time.time()))
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        if self.workers:
+            print(f"⚠️ {len(self.workers)} stream workers still busy after {timeout:.0f}s")
+
+    def _next_due(self):
+        """Block until the earliest stream is due and pop it (None when stopping)"""
+        with self.condition:
+            while self.running:
+                if self.schedule_heap:
+                    wait = self.schedule_heap[0][0] - time.time()
+                    if wait <= 0:
+                        due_time, _, location_key = heapq.heappop(self.schedule_heap)
+                        return due_time, location_key
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait()
+            return None
+
+    def _run(self):
+        """Worker loop: sample whichever stream is due next, then reschedule it"""
+        while self.running:
+            item = self._next_due()
+            if item is None:
+                break
+
+            due_time, location_key = item
+            start = time.time()
+
+            lag = start - due_time
+            self.samples += 1
+            self.total_lag += lag
+            if lag > 1.0:
+                self.late_samples += 1
+
+            try:
+                interval = self.sample_stream(location_key)
+            except Exception as e:
+                print(f"⚠️ [{location_key}] Stream worker error: {e}")
+                interval = 5.0
+
+            if interval is None:
+                # Stream is finished, drop it from the schedule
+                continue
+
+            # A slow stream is never scheduled in the past, so it can't burst to catch up
+            self.schedule(location_key, max(due_time + interval, time.time()))
+
+    def get_stats(self):
+        """Return scheduling statistics"""
+        avg_lag = self.total_lag / self.samples if self.samples else 0
+        return {
+            'workers': self.num_workers,
+            'samples': self.samples,
+            'late_samples': self.late_samples,
+            'avg_lag': avg_lag
+        }
@@ -0,0 +1,148 @@
+import json
+import os
+
+
+# Relative config paths that don't exist in the working directory are looked up here, so the
+# detector starts the same from the repo root as from Backend/
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Settings every stream gets unless the config file overrides them
+DEFAULT_STREAM_SETTINGS = {
+    'enabled': True,
+    'sample_interval': 1.0,        # seconds between analyzed frames
+    'sample_every': None,          # frames between analyzed frames (threads mode, overrides sample_interval)
+    'model': 'yolov4-tiny',
+    'input_size': [416, 416],
+    'letterbox': False,            # keep the aspect ratio (pad) instead of stretching to input_size
+    'ingest': 'opencv',            # 'opencv' or 'ffmpeg'
+    'keyframes_only': False,       # ffmpeg ingest only
+    'sinks': ['csv', 'firebase', 'sqlite', 'http'],
+    'publish': {                   # Firebase publish policy (see PublishPolicy)
+        'min_interval': 1.0,       # never publish more often than this (seconds)
+        'max_interval': 60.0,      # heartbeat even when nothing changed (seconds)
+        'on_change': True,
+        'deadbands': {'cars': 1, 'people': 2}
+    }
+}
+
+# Worker settings per sink (see SinkWorker); 'rollups' feeds the minute/hour/day aggregator
+DEFAULT_SINK_SETTINGS = {
+    'csv': {'max_queue': 10000, 'policy': 'drop', 'batch_size': 500, 'max_wait': 2.0},
+    'firebase': {'max_queue': 10000, 'policy': 'drop', 'batch_size': 200, 'max_wait': 0.5},
+    'sqlite': {'max_queue': 10000, 'policy': 'drop', 'batch_size': 500, 'max_wait': 2.0},
+    'http': {'max_queue': 1000, 'policy': 'drop', 'batch_size': 1, 'max_wait': 0},
+    'stdout': {'max_queue': 1000, 'policy': 'drop', 'batch_size': 50, 'max_wait': 0.5},
+    'rollups': {'max_queue': 10000, 'policy': 'drop', 'batch_size': 500, 'max_wait': 1.0}
+}
+
+# Live HTTP/SSE API; only reachable from this machine unless 'host' says otherwise
+DEFAULT_API_SETTINGS = {
+    'host': '127.0.0.1',
+    'port': None                   # None: the detector's api_port argument
+}
+
+DEFAULT_SCHEDULER_SETTINGS = {
+    'mode': 'pool',                # 'pool' (fixed worker pool) or 'threads' (reader + analyzer per stream)
+    'workers': 4,                  # stream worker threads in pool mode
+    'inference_mode': 'batched',   # 'batched' (one in-process net) or 'process' (inference worker processes)
+    'num_workers': None            # inference worker processes in 'process' mode (None: one per 4 cores)
+}
+
+
+def resolve_config_path(config_file):
+    """The config path as given if it exists, else the same relative path next to this module"""
+    if os.path.exists(config_file) or os.path.isabs(config_file):
+        return config_file
+    candidate = os.path.join(MODULE_DIR, config_file)
+    return candidate if os.path.exists(candidate) else config_file
+
+
+def read_config_file(config_file):
+    """Parse a JSON, TOML or YAML config file into a dict"""
+    config_file = resolve_config_path(config_file)
+    extension = os.path.splitext(config_file)[1].lower()
+
+    if extension == '.toml':
+        import tomllib
+        with open(config_file, 'rb') as f:
+            return tomllib.load(f)
+
+    if extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required for YAML stream configs: pip install pyyaml")
+        with open(config_file, 'r') as f:
+            return yaml.safe_load(f) or {}
+
+    with open(config_file, 'r') as f:
+        return json.load(f)
+
+
+def normalize_input_size(input_size):
+    """Accept 416 or [416, 416] and return a (width, height) tuple of multiples of 32"""
+    if isinstance(input_size, int):
+        input_size = [input_size, input_size]
+
+    width, height = int(input_size[0]), int(input_size[1])
+    if width % 32 or height % 32:
+        raise ValueError(f"input_size must be a multiple of 32, got {width}x{height}")
+
+    return (width, height)
+
+
+def load_stream_registry(config_file='locations.json'):
+    """
+    Load the stream registry
+    Returns (scheduler_settings, locations) where locations maps each location key to its
+    name, url, description and fully resolved per-stream settings. Disabled streams are skipped.
+    """
+    config = read_config_file(config_file)
+
+    scheduler = dict(DEFAULT_SCHEDULER_SETTINGS)
+    scheduler.update(config.get('scheduler') or {})
+
+    defaults = dict(DEFAULT_STREAM_SETTINGS)
+    defaults.update(config.get('defaults') or {})
+
+    locations = {}
+    for location_key, entry in (config.get('locations') or {}).items():
+        if 'name' not in entry or 'url' not in entry:
+            raise ValueError(f"Location '{location_key}' needs at least a name and a url")
+
+        location = dict(defaults)
+        location.update(entry)
+        location.setdefault('description', '')
+
+        # Publish settings merge key by key, so a stream can override just one of them
+        location['publish'] = dict(DEFAULT_STREAM_SETTINGS['publish'])
+        location['publish'].update((config.get('defaults') or {}).get('publish') or {})
+        location['publish'].update(entry.get('publish') or {})
+
+        if not location['enabled']:
+            continue
+
+        location['input_size'] = normalize_input_size(location['input_size'])
+        locations[str(location_key)] = location
+
+    return scheduler, locations
+
+
+def load_sink_settings(config_file='locations.json'):
+    """Per-sink worker settings: DEFAULT_SINK_SETTINGS overridden key by key by the config's 'sink_settings'"""
+    config = read_config_file(config_file)
+    overrides = config.get('sink_settings') or {}
+
+    settings = {}
+    for name, defaults in DEFAULT_SINK_SETTINGS.items():
+        settings[name] = dict(defaults)
+        settings[name].update(overrides.get(name) or {})
+
+    return settings
+
+
+def load_api_settings(config_file='locations.json'):
+    """Live API settings: DEFAULT_API_SETTINGS overridden by the config's 'api' section"""
+    settings = dict(DEFAULT_API_SETTINGS)
+    settings.update(read_config_file(config_file).get('api') or {})
+    return settings
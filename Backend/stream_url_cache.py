@@ -0,0 +1,275 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import yt_dlp
+
+
+# googlevideo URLs carry the expiry either as a query parameter (&expire=...)
+# or as a path segment on HLS manifests (/expire/.../)
+EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+class StreamUrlCache:
+    def __init__(self, cache_file='stream_url_cache.json', refresh_margin=1800, default_ttl=3 * 3600):
+        """
+        Cache of resolved YouTube stream URLs keyed by page URL and format ('video' / 'audio')
+        One yt_dlp extraction fills both formats. Entries expire at the URL's own expire=
+        timestamp and are persisted to disk; the background refresher renews the ones still
+        in use before they expire and drops the rest.
+        refresh_margin: seconds before expiry at which an entry gets refreshed
+        default_ttl: lifetime assumed for URLs without an expire= parameter
+        """
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+
+        self.entries = {}
+        self.last_used = {}     # page_url -> last time get()/peek() handed out one of its URLs
+        self.removed = {}       # key -> time it was invalidated or evicted, so save() won't merge it back
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.resolve_locks = {}
+        self.refresher = None
+        self.running = False
+
+        self.ydl_opts = {
+            'format': 'best[height<=480]/best',
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False,
+            'socket_timeout': 30,
+            'retries': 10,
+            'fragment_retries': 10,
+            'skip_unavailable_fragments': True,
+            'http_headers': {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            }
+        }
+
+        self.load()
+
+    @staticmethod
+    def make_key(page_url, fmt):
+        return f"{page_url}|{fmt}"
+
+    def parse_expiry(self, stream_url):
+        """Return the unix time a stream URL expires at"""
+        match = EXPIRE_PATTERN.search(stream_url)
+        if match:
+            return int(match.group(1))
+        return time.time() + self.default_ttl
+
+    # ---------------------- PERSISTENCE ----------------------
+
+    def read_cache_file(self):
+        """Unexpired entries of the cache file ({} if it is missing or unreadable)"""
+        if not os.path.exists(self.cache_file):
+            return {}
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read stream URL cache: {e}")
+            return {}
+
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if entry.get('expires_at', 0) > now}
+
+    def load(self):
+        """Load cached URLs from disk, dropping anything already expired"""
+        self.entries = self.read_cache_file()
+        if self.entries:
+            print(f"🗂️ Loaded {len(self.entries)} cached stream URLs")
+
+    def merge_from_disk(self):
+        """
+        Take over entries other processes resolved since we loaded the file: newer ones win,
+        and keys this cache removed stay gone unless re-resolved afterwards
+        Caller holds save_lock
+        """
+        on_disk = self.read_cache_file()
+        with self.lock:
+            for key, entry in on_disk.items():
+                resolved_at = entry.get('resolved_at', 0)
+                ours = self.entries.get(key)
+                if ours and ours['resolved_at'] >= resolved_at:
+                    continue
+                if self.removed.get(key, 0) >= resolved_at:
+                    continue
+                self.entries[key] = entry
+            return dict(self.entries)
+
+    def save(self):
+        """Merge with the file on disk and write the result atomically"""
+        # One writer at a time, each through its own temp file (other processes may share the cache)
+        with self.save_lock:
+            entries = self.merge_from_disk()
+
+            tmp_file = None
+            try:
+                fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.cache_file) + '.',
+                                                suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.cache_file)))
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entries, f, indent=2)
+                os.replace(tmp_file, self.cache_file)
+            except OSError as e:
+                print(f"⚠️ Could not save stream URL cache: {e}")
+                if tmp_file and os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+
+    # ---------------------- RESOLUTION ----------------------
+
+    def extract(self, page_url):
+        """Run one yt_dlp extraction and return {'video': url, 'audio': url}"""
+        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            info = ydl.extract_info(page_url, download=False)
+
+        formats = [f for f in info.get('formats') or [] if f.get('url')]
+
+        video_url = info.get('url')
+        if not video_url and formats:
+            video_url = formats[-1]['url']
+
+        # Prefer an audio-only format; live HLS streams usually only have muxed ones
+        audio_only = [f for f in formats if f.get('acodec') not in (None, 'none') and f.get('vcodec') == 'none']
+        with_audio = [f for f in formats if f.get('acodec') not in (None, 'none')]
+        if audio_only:
+            audio_url = audio_only[-1]['url']
+        elif info.get('url') and info.get('acodec') not in (None, 'none'):
+            audio_url = info['url']
+        elif with_audio:
+            audio_url = with_audio[-1]['url']
+        else:
+            audio_url = video_url
+
+        return {'video': video_url, 'audio': audio_url}
+
+    def resolve(self, page_url):
+        """Extract fresh URLs for a page and store every format from that one extraction"""
+        requested_at = time.time()
+        with self.lock:
+            resolve_lock = self.resolve_locks.setdefault(page_url, threading.Lock())
+
+        # Only one extraction per page at a time; concurrent callers reuse its result
+        with resolve_lock:
+            urls = self.resolved_since(page_url, requested_at)
+            if urls:
+                return urls
+
+            try:
+                urls = self.extract(page_url)
+            except Exception as e:
+                print(f"❌ Error getting stream: {e}")
+                return None
+
+            now = time.time()
+            with self.lock:
+                for fmt, stream_url in urls.items():
+                    if not stream_url:
+                        continue
+                    self.entries[self.make_key(page_url, fmt)] = {
+                        'page_url': page_url,
+                        'format': fmt,
+                        'url': stream_url,
+                        'resolved_at': now,
+                        'expires_at': self.parse_expiry(stream_url)
+                    }
+
+        self.save()
+        return urls
+
+    def resolved_since(self, page_url, since):
+        """{format: url} of a page if it was extracted at or after `since`, else None"""
+        with self.lock:
+            urls = {entry['format']: entry['url'] for entry in self.entries.values()
+                    if entry['page_url'] == page_url and entry['resolved_at'] >= since}
+        return urls or None
+
+    def mark_used(self, page_url):
+        with self.lock:
+            self.last_used[page_url] = time.time()
+
+    def peek(self, page_url, fmt='video'):
+        """Return the cached URL without ever extracting (None if missing or expired)"""
+        with self.lock:
+            entry = self.entries.get(self.make_key(page_url, fmt))
+        if entry and entry['expires_at'] > time.time():
+            self.mark_used(page_url)
+            return entry['url']
+        return None
+
+    def get(self, page_url, fmt='video', force=False):
+        """Return a usable stream URL, extracting only when the cached one is missing or about to expire"""
+        if not force:
+            with self.lock:
+                entry = self.entries.get(self.make_key(page_url, fmt))
+            if entry and entry['expires_at'] - self.refresh_margin > time.time():
+                self.mark_used(page_url)
+                return entry['url']
+
+        urls = self.resolve(page_url)
+        self.mark_used(page_url)
+        if urls is None:
+            # Fall back to a cached URL that is close to, but not past, its expiry
+            return self.peek(page_url, fmt)
+        return urls.get(fmt)
+
+    def invalidate(self, page_url):
+        """Forget every cached format for a page (e.g. the URL stopped working early)"""
+        now = time.time()
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry['page_url'] == page_url]:
+                del self.entries[key]
+                self.removed[key] = now
+
+    # ---------------------- BACKGROUND REFRESH ----------------------
+
+    def start_refresher(self, interval=60):
+        """Refresh entries in the background before they expire"""
+        if self.running:
+            return
+        self.running = True
+        self.refresher = threading.Thread(target=self._refresh_loop, args=(interval,), daemon=True)
+        self.refresher.start()
+
+    def stop_refresher(self):
+        self.running = False
+
+    def refresh_due(self):
+        """
+        Renew the entries about to expire whose page was used since it was last resolved,
+        and evict the others, so pages nobody asks for anymore aren't re-resolved forever
+        Returns (refreshed, evicted) page URL lists
+        """
+        now = time.time()
+        with self.lock:
+            # page_url -> when it was last resolved, for the pages with an entry due
+            due = {}
+            for entry in self.entries.values():
+                if entry['expires_at'] - self.refresh_margin <= now:
+                    due[entry['page_url']] = max(due.get(entry['page_url'], 0), entry['resolved_at'])
+            unused = [page_url for page_url, resolved_at in due.items()
+                      if self.last_used.get(page_url, 0) < resolved_at]
+
+        for page_url in unused:
+            self.invalidate(page_url)
+            print(f"🗑️ Dropped unused stream URL for {page_url}")
+        if unused:
+            self.save()
+
+        refreshed = []
+        for page_url in due:
+            if page_url not in unused and self.resolve(page_url):
+                refreshed.append(page_url)
+                print(f"🔄 Refreshed stream URL for {page_url}")
+        return refreshed, unused
+
+    def _refresh_loop(self, interval):
+        while self.running:
+            self.refresh_due()
+            time.sleep(interval)
@@ -0,0 +1,28 @@
+from aggregator import RunningStats
+
+
+def test_percentile_within_initial_histogram():
+    stats = RunningStats()
+    for value in range(1, 101):
+        stats.add(value)
+    assert stats.to_dict() == {'mean': 50.5, 'max': 100, 'p95': 95}
+
+
+def test_percentile_above_initial_histogram():
+    stats = RunningStats(max_value=100)
+    for value in range(0, 2000, 20):
+        stats.add(value)
+    stats.add(1500)
+    summary = stats.to_dict()
+    assert summary['max'] == 1980
+    assert summary['p95'] == 1880
+
+
+def test_large_outlier_grows_histogram():
+    stats = RunningStats(max_value=100)
+    for _ in range(19):
+        stats.add(3)
+    stats.add(1500)
+    assert stats.percentile(95) == 3
+    assert stats.percentile(100) == 1500
+    assert stats.to_dict()['max'] == 1500
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from publish_policy import PublishPolicy
+
+
+def test_make_key_bumps_same_instant():
+    policy = PublishPolicy()
+    now = datetime(2025, 1, 2, 3, 4, 5, 123456)
+    assert policy.make_key(now) == '20250102_030405_123456'
+    assert policy.make_key(now) == '20250102_030405_123457'
+
+
+def test_make_key_carries_microsecond_overflow_into_seconds():
+    policy = PublishPolicy()
+    now = datetime(2025, 1, 2, 3, 4, 5, 999999)
+    keys = [policy.make_key(now) for _ in range(3)]
+    assert keys == ['20250102_030405_999999', '20250102_030406_000000', '20250102_030406_000001']
+    assert keys == sorted(keys)
+
+
+def test_make_key_carries_into_the_next_day():
+    policy = PublishPolicy()
+    now = datetime(2025, 12, 31, 23, 59, 59, 999999)
+    policy.make_key(now)
+    assert policy.make_key(now) == '20260101_000000_000000'
@@ -0,0 +1,63 @@
+import json
+import time
+
+from stream_url_cache import StreamUrlCache
+
+
+def make_cache(tmp_path, **kwargs):
+    cache = StreamUrlCache(cache_file=str(tmp_path / 'stream_url_cache.json'), **kwargs)
+    cache.extract = lambda page_url: {'video': f'{page_url}/video', 'audio': f'{page_url}/audio'}
+    return cache
+
+
+def test_refresh_renews_used_pages_and_evicts_unused(tmp_path):
+    cache = make_cache(tmp_path, refresh_margin=3600, default_ttl=60)
+    cache.get('used')
+    cache.get('idle')
+    # Only 'used' is asked for again after its last resolution
+    with cache.lock:
+        for entry in cache.entries.values():
+            entry['resolved_at'] -= 10
+        for page_url in cache.last_used:
+            cache.last_used[page_url] -= 10
+    cache.get('used')
+
+    refreshed, evicted = cache.refresh_due()
+    assert refreshed == ['used']
+    assert evicted == ['idle']
+    assert {entry['page_url'] for entry in cache.entries.values()} == {'used'}
+
+    # Neither page is used after this refresh, so both go next time
+    refreshed, evicted = cache.refresh_due()
+    assert refreshed == []
+    assert evicted == ['used']
+    assert cache.entries == {}
+
+
+def test_save_merges_with_entries_written_by_another_process(tmp_path):
+    first = make_cache(tmp_path)
+    second = make_cache(tmp_path)
+    first.get('a')
+    second.get('b')
+
+    with open(first.cache_file) as f:
+        on_disk = json.load(f)
+    assert {entry['page_url'] for entry in on_disk.values()} == {'a', 'b'}
+
+
+def test_save_does_not_merge_back_removed_entries(tmp_path):
+    first = make_cache(tmp_path)
+    first.get('a')
+    second = make_cache(tmp_path)
+    second.invalidate('a')
+    second.get('b')
+
+    with open(second.cache_file) as f:
+        on_disk = json.load(f)
+    assert {entry['page_url'] for entry in on_disk.values()} == {'b'}
+
+    # A later resolution of the page by anyone brings it back
+    time.sleep(0.01)
+    first.get('a', force=True)
+    second.save()
+    assert second.peek('a') == 'a/video'